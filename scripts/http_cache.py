@@ -0,0 +1,244 @@
+"""
+On-disk HTTP response cache shared by the scraper scripts (stdlib only).
+
+Responses are stored gzipped under .cache/http/ at the project root, keyed
+by a sha256 of the request URL plus any caller-supplied "vary" parts (e.g.
+an agency code sent as a header).  Lookup rules:
+
+  1. An entry younger than its TTL is served without touching the network.
+  2. A stale entry that carried an ETag / Last-Modified header is revalidated
+     with a conditional GET; a 304 reuses the stored body and refreshes it.
+  3. Anything else is fetched normally and stored if the status is 200.
+
+Usage:
+  import http_cache
+  status, body = http_cache.get(url, headers={...}, ttl=6 * 3600)
+  body = http_cache.get_cached(url)   # fresh body or None, never hits network
+
+Set http_cache.enabled = False (e.g. from a --no-cache flag) to bypass it.
+
+Network fetches reuse one keep-alive connection per (thread, host), so a
+worker issuing consecutive queries to the same API pays the TCP + TLS
+handshake once instead of on every request.
+
+Pass retries=N to retry HTTP 429/5xx responses, honouring Retry-After and
+otherwise backing off exponentially.
+"""
+
+import email.utils
+import gzip
+import hashlib
+import http.client
+import io
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache", "http")
+
+DEFAULT_TTL = 7 * 24 * 3600  # seconds
+
+enabled = True
+
+USER_AGENT = f"Python-urllib/{sys.version_info[0]}.{sys.version_info[1]}"
+MAX_REDIRECTS = 5
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_BACKOFF = 1.5  # seconds; doubled on each attempt without Retry-After
+MAX_RETRY_DELAY = 60.0  # seconds; cap for any single wait
+
+_local = threading.local()
+
+
+def cache_path(url, vary=()):
+    """Path of the cache entry for a URL (and optional vary parts)."""
+    h = hashlib.sha256(url.encode("utf-8"))
+    for part in vary:
+        h.update(b"\0" + str(part).encode("utf-8"))
+    key = h.hexdigest()
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.gz")
+
+
+def _read_entry(path):
+    """Return (meta, body) for a cache entry, or (None, None) if absent/corrupt."""
+    try:
+        with gzip.open(path, "rb") as f:
+            meta = json.loads(f.readline())
+            return meta, f.read()
+    except (OSError, EOFError, ValueError):
+        return None, None
+
+
+def _write_entry(path, meta, body):
+    """Write a cache entry atomically (meta JSON line, then the raw body)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique per thread: workers may store the same URL at the same time
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with gzip.open(tmp, "wb") as f:
+        f.write(json.dumps(meta).encode("utf-8") + b"\n")
+        f.write(body)
+    os.replace(tmp, path)
+
+
+def get_cached(url, ttl=DEFAULT_TTL, vary=()):
+    """Return the cached body if a fresh entry exists, else None (no network)."""
+    if not enabled or ttl <= 0:
+        return None
+    path = cache_path(url, vary)
+    try:
+        if time.time() - os.path.getmtime(path) >= ttl:
+            return None
+    except OSError:
+        return None
+    return _read_entry(path)[1]
+
+
+def _connection(scheme, host, timeout):
+    """Return this thread's keep-alive connection to scheme://host."""
+    conns = _local.__dict__.setdefault("conns", {})
+    conn = conns.get((scheme, host))
+    if conn is None:
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        conn = conns[(scheme, host)] = cls(host, timeout=timeout)
+    elif conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    conn.timeout = timeout
+    return conn
+
+
+def _drop_connection(scheme, host):
+    conn = _local.__dict__.get("conns", {}).pop((scheme, host), None)
+    if conn is not None:
+        conn.close()
+
+
+def fetch(url, headers=None, timeout=30, _redirects=0):
+    """
+    Plain GET over a reused connection. Returns (status, headers, body_bytes).
+
+    Mirrors urllib.request.urlopen: redirects are followed, and any other
+    non-2xx status raises urllib.error.HTTPError (whose .read() returns the
+    body); connection failures raise urllib.error.URLError. When a proxy is
+    configured in the environment the request goes through urlopen instead.
+    """
+    parts = urllib.parse.urlsplit(url)
+    headers = {"User-Agent": USER_AGENT, **(headers or {})}
+    if parts.scheme in urllib.request.getproxies():
+        req = urllib.request.Request(url, headers=headers)
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.headers, resp.read()
+
+    target = parts.path or "/"
+    if parts.query:
+        target += "?" + parts.query
+
+    for attempt in range(2):
+        conn = _connection(parts.scheme, parts.netloc, timeout)
+        try:
+            conn.request("GET", target, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+            break
+        except (http.client.HTTPException, ConnectionError) as e:
+            # The server may have closed an idle keep-alive socket; retry once
+            _drop_connection(parts.scheme, parts.netloc)
+            if attempt:
+                raise urllib.error.URLError(e) from e
+        except OSError as e:
+            _drop_connection(parts.scheme, parts.netloc)
+            raise urllib.error.URLError(e) from e
+
+    if resp.will_close:
+        _drop_connection(parts.scheme, parts.netloc)
+
+    location = resp.headers.get("Location")
+    if resp.status in (301, 302, 303, 307, 308) and location and _redirects < MAX_REDIRECTS:
+        return fetch(urllib.parse.urljoin(url, location), headers, timeout, _redirects + 1)
+    if not 200 <= resp.status < 300:
+        raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(body))
+    return resp.status, resp.headers, body
+
+
+def retry_delay(headers, attempt):
+    """Seconds to wait before retry `attempt` (0-based): Retry-After if sent."""
+    value = headers.get("Retry-After") if headers is not None else None
+    delay = None
+    if value:
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                when = email.utils.parsedate_to_datetime(value)
+                delay = when.timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+    if delay is None:
+        delay = RETRY_BACKOFF * (2 ** attempt)
+    return min(max(delay, 0.0), MAX_RETRY_DELAY)
+
+
+def fetch_retrying(url, headers=None, timeout=30, retries=0, on_throttle=None):
+    """fetch() that retries 429/5xx up to `retries` times before raising."""
+    for attempt in range(retries + 1):
+        try:
+            return fetch(url, headers, timeout)
+        except urllib.error.HTTPError as e:
+            if e.code not in RETRY_STATUSES or attempt == retries:
+                raise
+            if e.code == 429 and on_throttle is not None:
+                on_throttle()
+            time.sleep(retry_delay(e.headers, attempt))
+
+
+def get(url, headers=None, ttl=DEFAULT_TTL, vary=(), timeout=30,
+        retries=0, on_throttle=None):
+    """
+    GET a URL through the cache. Returns (status_code, body_bytes).
+
+    Failed requests raise urllib.error.HTTPError / URLError exactly like
+    urllib.request.urlopen, so callers keep their existing error handling.
+    A ttl of 0 (or enabled = False) performs a plain uncached GET.
+    `retries` / `on_throttle` are passed to fetch_retrying().
+    """
+    headers = dict(headers or {})
+    if not enabled or ttl <= 0:
+        status, _, body = fetch_retrying(url, headers, timeout, retries, on_throttle)
+        return status, body
+
+    path = cache_path(url, vary)
+    meta, body = _read_entry(path)
+    if body is not None:
+        if time.time() - os.path.getmtime(path) < ttl:
+            return 200, body
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        status, resp_headers, new_body = fetch_retrying(
+            url, headers, timeout, retries, on_throttle
+        )
+        etag = resp_headers.get("ETag")
+        last_modified = resp_headers.get("Last-Modified")
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and body is not None:
+            os.utime(path)  # Revalidated: restart the TTL clock
+            return 200, body
+        raise
+
+    if status == 200:
+        _write_entry(path, {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+        }, new_body)
+    return status, new_body
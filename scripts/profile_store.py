@@ -0,0 +1,131 @@
+"""
+Read/write helpers for city profile JSON shared by the scraper scripts.
+
+Profiles in public/data/cities/ are always written the same way:
+2-space indent, UTF-8 (ensure_ascii=False) and a trailing newline. Keeping
+that in one place means every scraper produces byte-identical output for
+identical data, so git diffs only show real changes.
+
+write_profile() leaves a file untouched (content and mtime) when the new
+bytes match what is already on disk, so reruns that change nothing do no
+writes at all. Changed files are written to a temp file and renamed into
+place, so an interrupted run never leaves a truncated profile behind.
+
+Usage:
+  from profile_store import read_profile, write_profile
+  profile = read_profile(path)
+  write_profile(path, profile)   # -> False if the file was already current
+
+When several scrapers run in one process (see run-profile-scrapers.py),
+wrap them in `with coalesced() as store:`. While it is active,
+read_profile() parses each file at most once and write_profile() only
+records the new version; store.flush_all() then writes every changed
+profile a single time.
+"""
+
+import contextlib
+import json
+import os
+
+
+def _load(path):
+    with open(path, "rb") as f:
+        return json.loads(f.read())
+
+
+def read_profile(path):
+    """Load a profile with a single bytes read (or from the active store)."""
+    if _active is not None:
+        return _active.load_once(path)
+    return _load(path)
+
+
+def dump_profile(profile):
+    """Serialize a profile to the canonical on-disk bytes."""
+    return (json.dumps(profile, indent=2, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def write_profile(path, profile):
+    """
+    Serialize once and write the encoded bytes in a single call.
+    Returns False (and skips the write) if the file already holds these bytes.
+    Inside coalesced() the write is deferred to the store's flush_all().
+    """
+    if _active is not None:
+        _active.patch(path, profile)
+        return True
+    return _write(path, profile)
+
+
+def _write(path, profile):
+    data = dump_profile(profile)
+    try:
+        # A size mismatch settles most changes without reading the file
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+    return True
+
+
+class ProfileStore:
+    """In-memory profiles keyed by absolute path, with a dirty set."""
+
+    def __init__(self):
+        self._profiles = {}
+        self._dirty = set()
+
+    def load_once(self, path):
+        """Parse a profile the first time it is asked for; reuse it after."""
+        path = os.path.abspath(path)
+        profile = self._profiles.get(path)
+        if profile is None:
+            profile = self._profiles[path] = _load(path)
+        return profile
+
+    def patch(self, path, profile):
+        """Record a new version of a profile to be written by flush_all()."""
+        path = os.path.abspath(path)
+        self._profiles[path] = profile
+        self._dirty.add(path)
+
+    def flush_all(self):
+        """Write every patched profile once. Returns the number of files changed."""
+        written = 0
+        for path in sorted(self._dirty):
+            if _write(path, self._profiles[path]):
+                written += 1
+        self._dirty.clear()
+        return written
+
+
+_active = None
+
+
+def coalescing():
+    """True while a coalesced() block is active."""
+    return _active is not None
+
+
+@contextlib.contextmanager
+def coalesced():
+    """Route read_profile/write_profile through one ProfileStore for the block."""
+    global _active
+    if _active is not None:
+        raise RuntimeError("profile_store.coalesced() is already active")
+    _active = ProfileStore()
+    try:
+        yield _active
+    finally:
+        _active = None
@@ -0,0 +1,64 @@
+"""
+Request pacing shared by the scraper scripts (stdlib only).
+
+Usage:
+  from rate_limit import RateLimiter
+  limiter = RateLimiter(0.25)   # at most one request start every 0.25s
+  limiter.wait()                # call before each request
+
+Safe to share between threads: each caller reserves the next free slot
+under a lock and then sleeps outside it, so concurrent workers are spaced
+out instead of all firing together.
+
+The spacing adapts AIMD-style: call backoff() when the server throttles
+(HTTP 429) to halve the request rate, and recover() after a successful
+request to add the base rate back, until the configured interval is
+reached again.
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Space request starts at least `interval` seconds apart on a monotonic
+    clock. Time already spent inside the previous request counts toward the
+    gap, so a slow response is followed by the next call immediately.
+    """
+
+    MIN_BACKOFF = 0.5  # seconds; first backoff step when interval is 0
+    MAX_BACKOFF = 30.0  # seconds; never space requests further than this
+
+    def __init__(self, interval):
+        self.base_interval = interval
+        self.interval = interval
+        self.last = float("-inf")
+        self._lock = threading.Lock()
+
+    def backoff(self):
+        """Server pushed back: halve the request rate (double the spacing)."""
+        with self._lock:
+            self.interval = min(
+                max(self.interval * 2, self.MIN_BACKOFF), self.MAX_BACKOFF
+            )
+
+    def recover(self):
+        """A request succeeded: add the base rate back, up to the base rate."""
+        with self._lock:
+            if self.interval <= self.base_interval:
+                return
+            if self.base_interval <= 0:
+                self.interval = self.base_interval
+                return
+            rate = 1 / self.interval + 1 / self.base_interval
+            self.interval = max(self.base_interval, 1 / rate)
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.last + self.interval)
+            self.last = start
+        delta = start - now
+        if delta > 0:
+            time.sleep(delta)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Run the profile scrapers back-to-back with a single profile write-back.
+
+Runs scrape-socrata-permits.py, scrape-hud-vacancy.py,
+scrape-cdc-places.py and scrape-accela-permits.py in one process inside
+profile_store.coalesced().
+Each city profile is parsed at most once and written at most once,
+instead of once per scraper.
+
+A scraper that fails does not stop the others; whatever they updated is
+still written. The Accela scraper is best-effort (as in CI): its failure
+does not change the exit status.
+
+Usage:
+  python3 scripts/run-profile-scrapers.py
+  python3 scripts/run-profile-scrapers.py --dry-run
+  python3 scripts/run-profile-scrapers.py --city chicago
+  python3 scripts/run-profile-scrapers.py --only cdc vacancy
+  python3 scripts/run-profile-scrapers.py --only socrata
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+import traceback
+
+import profile_store
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (script file, required for a successful run)
+SCRAPERS = {
+    "socrata": ("scrape-socrata-permits.py", True),
+    "vacancy": ("scrape-hud-vacancy.py", True),
+    "cdc": ("scrape-cdc-places.py", True),
+    "accela": ("scrape-accela-permits.py", False),
+}
+
+
+def load_script(filename):
+    """Import a hyphenated sibling script as a module."""
+    path = os.path.join(SCRIPT_DIR, filename)
+    name = os.path.splitext(filename)[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_scraper(filename, argv):
+    """Run a script's main() with the given argv. Returns True on success."""
+    saved_argv = sys.argv
+    sys.argv = [os.path.join(SCRIPT_DIR, filename)] + argv
+    try:
+        # Some scripts return their exit status instead of calling sys.exit()
+        return load_script(filename).main() in (None, 0)
+    except SystemExit as e:
+        return e.code in (None, 0)
+    except Exception:
+        traceback.print_exc()
+        return False
+    finally:
+        sys.argv = saved_argv
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the profile scrapers with one coalesced write-back"
+    )
+    parser.add_argument("--city", help="Process a single city by slug")
+    parser.add_argument("--dry-run", action="store_true", help="Preview without writing files")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk HTTP cache")
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=list(SCRAPERS),
+        help="Run only these scrapers (default: all, in the order listed)",
+    )
+    args = parser.parse_args()
+
+    argv = []
+    if args.city:
+        argv += ["--city", args.city]
+    if args.dry_run:
+        argv.append("--dry-run")
+    if args.no_cache:
+        argv.append("--no-cache")
+
+    names = [n for n in SCRAPERS if not args.only or n in args.only]
+    failed = []
+
+    start = time.time()
+    with profile_store.coalesced() as store:
+        for name in names:
+            filename, required = SCRAPERS[name]
+            print(f"\n{'=' * 70}\n{filename}\n{'=' * 70}")
+            if not run_scraper(filename, argv):
+                print(f"\n  {filename} FAILED")
+                if required:
+                    failed.append(name)
+
+        if args.dry_run:
+            print("\n[DRY RUN] No profiles written.")
+        else:
+            written = store.flush_all()
+            print(f"\nWrote {written} changed profiles")
+
+    print(f"Elapsed: {time.time() - start:.1f}s")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,22 +17,28 @@ Usage:
   python scripts/scrape-accela-permits.py --test-auth         # Only test authentication
   python scripts/scrape-accela-permits.py --limit 10          # Process first N cities
   python scripts/scrape-accela-permits.py --update-mapping    # Update agency IDs in profiles
+  python scripts/scrape-accela-permits.py --no-cache          # Bypass the on-disk HTTP cache
 
 Environment:
   ACCELA_APP_ID       - Accela developer app ID (required or uses default)
   ACCELA_APP_SECRET   - Accela developer app secret (required or uses default)
 """
 
-import argparse
+import functools
 import json
 import os
 import sys
 import time
+import types
 import urllib.request
 import urllib.parse
 import urllib.error
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import Counter, defaultdict
+
+import http_cache
+from profile_store import read_profile, write_profile
+from rate_limit import RateLimiter
 
 # -------------------------------------------------------------------
 # Configuration
@@ -53,10 +59,12 @@ ACCELA_AUTH_URL = "https://auth.accela.com/oauth2/token"
 ACCELA_API_BASE = "https://apis.accela.com/v4"
 
 # Rate limiting
-REQUEST_DELAY = 1.0  # 1 second between API calls (conservative)
+REQUEST_DELAY = 1.0  # minimum seconds between API call starts (conservative)
 AUTH_TIMEOUT = 30     # seconds
 API_TIMEOUT = 30      # seconds
 MAX_RECORDS_PER_QUERY = 1000  # Accela max is typically 1000
+RATE_LIMIT_RETRIES = 3  # back off and retry this many times on HTTP 429
+RECORDS_CACHE_TTL = 6 * 3600  # seconds; stale pages are revalidated via ETag
 
 # -------------------------------------------------------------------
 # Agency-to-City Mapping
@@ -68,7 +76,7 @@ MAX_RECORDS_PER_QUERY = 1000  # Accela max is typically 1000
 # Format: "ACCELA_CODE": "govdirectory_slug"
 # -------------------------------------------------------------------
 
-AGENCY_TO_CITY = {
+AGENCY_TO_CITY = types.MappingProxyType({
     # -- Direct matches (code.lower() == slug) --
     "ALAMEDA": "alameda",
     "BALTIMORE": "baltimore",
@@ -152,10 +160,10 @@ AGENCY_TO_CITY = {
     "BERKELEY": "berkeley",
     "ANAHEIM": "anaheim",
     "INGLEWOOD": "inglewood",
-}
+})
 
 # Reverse mapping for lookup by slug
-CITY_TO_AGENCY = {v: k for k, v in AGENCY_TO_CITY.items()}
+CITY_TO_AGENCY = types.MappingProxyType({v: k for k, v in AGENCY_TO_CITY.items()})
 
 # -------------------------------------------------------------------
 # Permit type normalization
@@ -188,6 +196,7 @@ PERMIT_TYPE_MAP = {
 }
 
 
+@functools.lru_cache(maxsize=None)
 def normalize_permit_type(record_type_str):
     """
     Normalize an Accela record type string (e.g., "Building/Residential/New/NA")
@@ -214,6 +223,9 @@ def normalize_permit_type(record_type_str):
 # HTTP helpers (stdlib only, no external deps)
 # -------------------------------------------------------------------
 
+RATE_LIMITER = RateLimiter(REQUEST_DELAY)
+
+
 def http_post_form(url, data, timeout=30):
     """POST form-encoded data, return (status_code, response_dict)."""
     encoded = urllib.parse.urlencode(data).encode("utf-8")
@@ -239,15 +251,19 @@ def http_post_form(url, data, timeout=30):
         return 0, {"error": "exception", "error_description": str(e)[:500]}
 
 
-def http_get(url, headers=None, params=None, timeout=30):
-    """GET with headers and query params, return (status_code, response_dict)."""
+def http_get(url, headers=None, params=None, timeout=30, cache_ttl=0, cache_vary=()):
+    """
+    GET with headers and query params, return (status_code, response_dict).
+    With cache_ttl > 0 the response goes through the on-disk http_cache
+    (conditional GET once the entry is older than cache_ttl).
+    """
     if params:
         url = url + "?" + urllib.parse.urlencode(params)
-    req = urllib.request.Request(url, headers=headers or {}, method="GET")
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            body = resp.read().decode("utf-8")
-            return resp.status, json.loads(body)
+        status, body = http_cache.get(
+            url, headers, ttl=cache_ttl, vary=cache_vary, timeout=timeout,
+        )
+        return status, json.loads(body.decode("utf-8"))
     except urllib.error.HTTPError as e:
         body = e.read().decode("utf-8")
         try:
@@ -271,6 +287,7 @@ class AccelaClient:
         self.app_id = app_id
         self.app_secret = app_secret
         self._tokens = {}  # agency_code -> (token, expiry_time)
+        self._headers = {}  # (agency_code, token) -> request headers
 
     def authenticate(self, agency_code, environment="PROD"):
         """
@@ -278,9 +295,10 @@ class AccelaClient:
         Returns (token_string, error_string). On success error is None.
         """
         cached = self._tokens.get(agency_code)
-        if cached and cached[1] > time.time():
+        if cached and cached[1] > time.monotonic():
             return cached[0], None
 
+        RATE_LIMITER.wait()
         status, resp = http_post_form(ACCELA_AUTH_URL, {
             "grant_type": "client_credentials",
             "client_id": self.app_id,
@@ -293,60 +311,110 @@ class AccelaClient:
         if status == 200 and "access_token" in resp:
             token = resp["access_token"]
             expires_in = resp.get("expires_in", 3600)
-            self._tokens[agency_code] = (token, time.time() + expires_in - 60)
+            self._tokens[agency_code] = (token, time.monotonic() + expires_in - 60)
             return token, None
         else:
             err = resp.get("error_description", resp.get("error", f"HTTP {status}"))
             return None, err
 
-    def get_records(self, agency_code, token, record_type="Building/*",
-                    date_from=None, date_to=None, offset=0, limit=100):
-        """
-        Query records (permits) for an agency.
-        Returns (records_list, total_count, error_string).
-        """
-        params = {"limit": limit, "offset": offset}
+    def _auth_headers(self, agency_code, token):
+        """Return the request headers for an agency, built once per token."""
+        key = (agency_code, token)
+        headers = self._headers.get(key)
+        if headers is None:
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "x-accela-agency": agency_code,
+            }
+            self._headers[key] = headers
+        return headers
+
+    @staticmethod
+    def _build_query(record_type=None, date_from=None, date_to=None):
+        """Encode the filter part of a /records query (identical across pages)."""
+        params = {}
         if record_type:
             params["type"] = record_type
         if date_from:
             params["openedDateFrom"] = date_from
         if date_to:
             params["openedDateTo"] = date_to
+        return urllib.parse.urlencode(params)
 
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "x-accela-agency": agency_code,
-        }
+    def _records_url(self, record_type=None, date_from=None, date_to=None):
+        """Prebuilt /records URL; pages only append limit and offset."""
+        query = self._build_query(record_type, date_from, date_to)
+        return f"{ACCELA_API_BASE}/records?{query}&" if query else f"{ACCELA_API_BASE}/records?"
 
-        status, resp = http_get(
-            f"{ACCELA_API_BASE}/records",
-            headers=headers,
-            params=params,
-            timeout=API_TIMEOUT,
-        )
+    def _fetch_page(self, records_url, headers, offset, limit):
+        """
+        Fetch one page from a prebuilt records URL, backing off on HTTP 429.
+        Returns (records, total_rows, error); total_rows is None when the
+        agency does not report page.totalRows.
+        """
+        url = f"{records_url}limit={limit}&offset={offset}"
+        # The token is not part of the URL, so key the cache by agency
+        vary = (headers["x-accela-agency"],)
+        status, resp = None, None
+
+        # A fresh cache entry needs no request, so it doesn't wait on the limiter
+        body = http_cache.get_cached(url, ttl=RECORDS_CACHE_TTL, vary=vary)
+        if body is not None:
+            try:
+                status, resp = 200, json.loads(body.decode("utf-8"))
+            except ValueError:
+                pass
+
+        if status is None:
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                RATE_LIMITER.wait()
+                status, resp = http_get(
+                    url, headers=headers, timeout=API_TIMEOUT,
+                    cache_ttl=RECORDS_CACHE_TTL, cache_vary=vary,
+                )
+                if status != 429 or attempt == RATE_LIMIT_RETRIES:
+                    break
+                time.sleep(REQUEST_DELAY * 2 ** attempt)
 
         if status == 200:
             records = resp.get("result", [])
-            total = resp.get("page", {}).get("totalRows", len(records))
-            return records, total, None
+            return records, resp.get("page", {}).get("totalRows"), None
         else:
             err = resp.get("error_description", resp.get("error", f"HTTP {status}"))
             return [], 0, err
 
+    def get_records(self, agency_code, token, record_type="Building/*",
+                    date_from=None, date_to=None, offset=0, limit=100):
+        """
+        Query records (permits) for an agency.
+        Returns (records_list, total_count, error_string).
+        """
+        records, total, err = self._fetch_page(
+            self._records_url(record_type, date_from, date_to),
+            self._auth_headers(agency_code, token),
+            offset, limit,
+        )
+        return records, len(records) if total is None else total, err
+
     def get_all_records(self, agency_code, token, record_type="Building/*",
-                        date_from=None, date_to=None, max_records=5000):
+                        date_from=None, date_to=None, max_records=5000,
+                        batch_size=MAX_RECORDS_PER_QUERY):
         """
         Paginate through all records matching the query.
+        Pages are requested at the server maximum, so most agencies need one call.
         Returns (all_records, error_string).
         """
         all_records = []
         offset = 0
-        batch_size = 200
+        batch_size = min(batch_size, max_records)
+
+        # URL prefix and headers are the same for every page
+        records_url = self._records_url(record_type, date_from, date_to)
+        headers = self._auth_headers(agency_code, token)
 
         while offset < max_records:
-            records, total, err = self.get_records(
-                agency_code, token, record_type,
-                date_from, date_to, offset, batch_size,
+            records, total, err = self._fetch_page(
+                records_url, headers, offset, batch_size,
             )
             if err:
                 if all_records:
@@ -355,22 +423,41 @@ class AccelaClient:
                 return all_records, err
 
             all_records.extend(records)
-            if len(records) < batch_size or len(all_records) >= total:
+            if len(records) < batch_size or (total is not None and len(all_records) >= total):
                 break
             offset += batch_size
-            time.sleep(REQUEST_DELAY)
 
         return all_records, None
 
+    def count_records(self, agency_code, token, record_type="Building/*",
+                      date_from=None, date_to=None, max_records=5000):
+        """
+        Count records matching the query, capped at max_records like
+        get_all_records. Reads page.totalRows from a one-row page and only
+        paginates through the records when the agency does not report it.
+        Returns (count, error_string).
+        """
+        records, total, err = self._fetch_page(
+            self._records_url(record_type, date_from, date_to),
+            self._auth_headers(agency_code, token),
+            0, 1,
+        )
+        if err:
+            return 0, err
+        if total is not None:
+            return min(total, max_records), None
+
+        records, err = self.get_all_records(
+            agency_code, token, record_type, date_from, date_to, max_records,
+        )
+        return len(records), err
+
     def get_record_types(self, agency_code, token):
         """Get available record types for an agency."""
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "x-accela-agency": agency_code,
-        }
+        RATE_LIMITER.wait()
         status, resp = http_get(
             f"{ACCELA_API_BASE}/settings/records/types",
-            headers=headers,
+            headers=self._auth_headers(agency_code, token),
             timeout=API_TIMEOUT,
         )
         if status == 200:
@@ -384,6 +471,39 @@ class AccelaClient:
 # Data processing
 # -------------------------------------------------------------------
 
+VALUE_FIELDS = ("jobValue", "totalFee", "estimatedValue", "totalJobCost")
+
+
+def _record_type_str(record):
+    """Flatten an Accela record's type into "Building/Residential/New" form."""
+    rtype = record.get("type", {})
+    if isinstance(rtype, dict):
+        # Accela returns type as {"type": "Building", "subType": "Residential", ...}
+        return "/".join(filter(None, [
+            rtype.get("type", ""),
+            rtype.get("subType", ""),
+            rtype.get("category", ""),
+        ]))
+    elif isinstance(rtype, str):
+        return rtype
+    return ""
+
+
+def _record_value(record):
+    """First positive value among job value, total fee, estimated value, job cost."""
+    value = None
+    for vfield in VALUE_FIELDS:
+        v = record.get(vfield)
+        if v is not None:
+            try:
+                value = float(v)
+                if value > 0:
+                    break
+            except (ValueError, TypeError):
+                continue
+    return value if value and value > 0 else None
+
+
 def process_records(records):
     """
     Analyze a list of Accela records and extract permit statistics.
@@ -397,47 +517,16 @@ def process_records(records):
             "record_count": 0,
         }
 
-    type_counts = defaultdict(int)
-    values = []
-
-    for record in records:
-        # Extract record type
-        rtype = record.get("type", {})
-        if isinstance(rtype, dict):
-            # Accela returns type as {"type": "Building", "subType": "Residential", ...}
-            type_str = "/".join(filter(None, [
-                rtype.get("type", ""),
-                rtype.get("subType", ""),
-                rtype.get("category", ""),
-            ]))
-        elif isinstance(rtype, str):
-            type_str = rtype
-        else:
-            type_str = ""
-
-        category = normalize_permit_type(type_str)
-        type_counts[category] += 1
-
-        # Extract value (job value, total fee, estimated value)
-        value = None
-        for vfield in ["jobValue", "totalFee", "estimatedValue", "totalJobCost"]:
-            v = record.get(vfield)
-            if v is not None:
-                try:
-                    value = float(v)
-                    if value > 0:
-                        break
-                except (ValueError, TypeError):
-                    continue
-
-        if value and value > 0:
-            values.append(value)
+    # One pass per column, then reduce each column on its own
+    type_strs = [_record_type_str(r) for r in records]
+    values = [v for v in map(_record_value, records) if v is not None]
 
+    type_counts = Counter(map(normalize_permit_type, type_strs))
     avg_value = round(sum(values) / len(values)) if values else None
 
     return {
         "permits_12mo": len(records),
-        "permit_types": dict(sorted(type_counts.items(), key=lambda x: -x[1])),
+        "permit_types": dict(type_counts.most_common()),
         "avg_permit_value": avg_value,
         "record_count": len(records),
         "valued_count": len(values),
@@ -461,8 +550,7 @@ def load_city_profile(slug):
     if not os.path.exists(filepath):
         return None, None
     try:
-        with open(filepath, "r") as f:
-            return json.load(f), filepath
+        return read_profile(filepath), filepath
     except (json.JSONDecodeError, IOError) as e:
         print(f"  ERROR: Cannot load {filepath}: {e}")
         return None, None
@@ -470,9 +558,7 @@ def load_city_profile(slug):
 
 def save_city_profile(data, filepath):
     """Save city profile JSON with consistent formatting."""
-    with open(filepath, "w") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-        f.write("\n")
+    write_profile(filepath, data)
 
 
 def update_city_profile(slug, permit_stats, yoy_trend, dry_run=False):
@@ -480,6 +566,19 @@ def update_city_profile(slug, permit_stats, yoy_trend, dry_run=False):
     Update a city profile with permit data from Accela.
     Returns True if the profile was updated.
     """
+    if dry_run:
+        # Report only; skip the load/merge/serialize work entirely
+        filepath = os.path.join(DATA_DIR, f"{slug}.json")
+        if not os.path.exists(filepath):
+            print(f"  SKIP: No city profile found for slug '{slug}'")
+            return False
+        print(f"  DRY RUN: Would update {filepath}")
+        print(f"    permits_12mo={permit_stats['permits_12mo']}, "
+              f"types={permit_stats['permit_types']}, "
+              f"avg_value={permit_stats['avg_permit_value']}, "
+              f"yoy={yoy_trend}")
+        return True
+
     data, filepath = load_city_profile(slug)
     if data is None:
         print(f"  SKIP: No city profile found for slug '{slug}'")
@@ -502,14 +601,6 @@ def update_city_profile(slug, permit_stats, yoy_trend, dry_run=False):
         ds["accela"] = "available"  # Mark as available even if no records found
     data["data_sources"] = ds
 
-    if dry_run:
-        print(f"  DRY RUN: Would update {filepath}")
-        print(f"    permits_12mo={permit_stats['permits_12mo']}, "
-              f"types={permit_stats['permit_types']}, "
-              f"avg_value={permit_stats['avg_permit_value']}, "
-              f"yoy={yoy_trend}")
-        return True
-
     save_city_profile(data, filepath)
     print(f"  SAVED: {filepath}")
     return True
@@ -562,42 +653,35 @@ def load_accela_portals():
     return data.get("portals", [])
 
 
+@functools.lru_cache(maxsize=1)
 def get_all_agency_mappings():
     """
     Build the complete list of (agency_code, city_slug) pairs to process.
     Combines:
-      1. The hardcoded AGENCY_TO_CITY mapping
+      1. The hardcoded AGENCY_TO_CITY mapping (which already covers every
+         verified portal code from accela_portals.json we know a slug for)
       2. Existing accela_agency_id values from city profiles
-      3. Verified portals from accela_portals.json
-    """
-    mappings = {}  # agency_code -> city_slug
 
-    # Start with hardcoded mapping
-    mappings.update(AGENCY_TO_CITY)
-
-    # Add from accela_portals.json
-    portals = load_accela_portals()
-    for portal in portals:
-        code = portal.get("code", "")
-        if code and code in AGENCY_TO_CITY:
-            mappings[code] = AGENCY_TO_CITY[code]
+    The result is computed once per process and returned read-only.
+    """
+    # Start with hardcoded mapping (agency_code -> city_slug)
+    mappings = dict(AGENCY_TO_CITY)
 
     # Add from existing city profiles (for agencies not in portals)
-    import glob
-    for filepath in glob.glob(os.path.join(DATA_DIR, "*.json")):
-        slug = os.path.basename(filepath).replace(".json", "")
-        if slug.startswith("_"):
-            continue
-        try:
-            with open(filepath) as f:
-                data = json.load(f)
-            agency_id = data.get("governance", {}).get("accela_agency_id", "")
-            if agency_id and agency_id not in mappings:
-                mappings[agency_id] = slug
-        except (json.JSONDecodeError, IOError):
-            continue
-
-    return mappings
+    with os.scandir(DATA_DIR) as entries:
+        for entry in entries:
+            name = entry.name
+            if not name.endswith(".json") or name.startswith("_"):
+                continue
+            try:
+                data = read_profile(entry.path)
+                agency_id = data.get("governance", {}).get("accela_agency_id", "")
+                if agency_id and agency_id not in mappings:
+                    mappings[agency_id] = name[:-5]
+            except (json.JSONDecodeError, IOError):
+                continue
+
+    return types.MappingProxyType(mappings)
 
 
 # -------------------------------------------------------------------
@@ -619,7 +703,6 @@ def test_authentication(client, agency_codes):
             results["failed"].append(code)
             results["errors"][err].append(code)
             print(f"  FAIL  {code}: {err}")
-        time.sleep(REQUEST_DELAY)
 
     print(f"\n--- Authentication Summary ---")
     print(f"  Success: {len(results['success'])}")
@@ -631,11 +714,28 @@ def test_authentication(client, agency_codes):
     return results
 
 
-def process_agency(client, agency_code, city_slug, dry_run=False):
+def date_windows(now):
+    """
+    Return ((date_from, date_to), (prior_from, prior_to)) for the current and
+    prior 12-month windows ending at `now`, as Accela YYYY-MM-DD strings.
+    """
+    year_ago = (now - timedelta(days=365)).strftime("%Y-%m-%d")
+    return (
+        (year_ago, now.strftime("%Y-%m-%d")),
+        ((now - timedelta(days=730)).strftime("%Y-%m-%d"), year_ago),
+    )
+
+
+def process_agency(client, agency_code, city_slug, dry_run=False, windows=None):
     """
     Process a single agency: authenticate, fetch permits, update city profile.
+    `windows` is the date_windows() tuple shared by the whole run.
     Returns a result dict.
     """
+    if windows is None:
+        windows = date_windows(datetime.now())
+    (date_from, date_to), (prior_from, prior_to) = windows
+
     result = {
         "agency_code": agency_code,
         "city_slug": city_slug,
@@ -655,13 +755,8 @@ def process_agency(client, agency_code, city_slug, dry_run=False):
         return result
 
     print(f"  [{agency_code}] Auth OK, fetching permits...")
-    time.sleep(REQUEST_DELAY)
 
     # Step 2: Fetch current 12-month window
-    now = datetime.now()
-    date_from = (now - timedelta(days=365)).strftime("%Y-%m-%d")
-    date_to = now.strftime("%Y-%m-%d")
-
     records, err = client.get_all_records(
         agency_code, token,
         record_type="Building/*",
@@ -673,7 +768,6 @@ def process_agency(client, agency_code, city_slug, dry_run=False):
     if err and not records:
         # Try without type filter (some agencies don't support Building/*)
         print(f"  [{agency_code}] Building/* failed ({err}), trying without type filter...")
-        time.sleep(REQUEST_DELAY)
         records, err = client.get_all_records(
             agency_code, token,
             record_type=None,
@@ -694,21 +788,17 @@ def process_agency(client, agency_code, city_slug, dry_run=False):
     current_stats = process_records(records)
 
     # Step 4: Fetch prior 12-month window for YoY comparison
-    prior_from = (now - timedelta(days=730)).strftime("%Y-%m-%d")
-    prior_to = (now - timedelta(days=365)).strftime("%Y-%m-%d")
-
-    time.sleep(REQUEST_DELAY)
-    prior_records, prior_err = client.get_all_records(
+    # Only the count is needed for the prior window, not the records
+    prior_count, prior_err = client.count_records(
         agency_code, token,
         record_type="Building/*",
         date_from=prior_from,
         date_to=prior_to,
         max_records=MAX_RECORDS_PER_QUERY,
     )
-    if prior_err and not prior_records:
+    if prior_err:
         # Try without type filter
-        time.sleep(REQUEST_DELAY)
-        prior_records, prior_err = client.get_all_records(
+        prior_count, prior_err = client.count_records(
             agency_code, token,
             record_type=None,
             date_from=prior_from,
@@ -716,7 +806,6 @@ def process_agency(client, agency_code, city_slug, dry_run=False):
             max_records=MAX_RECORDS_PER_QUERY,
         )
 
-    prior_count = len(prior_records) if prior_records else 0
     yoy_trend = compute_yoy_trend(current_stats["permits_12mo"], prior_count)
 
     print(f"  [{agency_code}] Prior window: {prior_count} records, YoY: {yoy_trend}%")
@@ -733,6 +822,8 @@ def process_agency(client, agency_code, city_slug, dry_run=False):
 
 
 def main():
+    import argparse  # Only needed on the CLI path
+
     parser = argparse.ArgumentParser(
         description="Scrape Accela building permit data for govdirectory cities"
     )
@@ -743,9 +834,12 @@ def main():
     parser.add_argument("--limit", type=int, help="Process first N cities only")
     parser.add_argument("--update-mapping", action="store_true",
                         help="Update agency IDs in city profiles from accela_portals.json")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the on-disk HTTP response cache")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
 
     args = parser.parse_args()
+    http_cache.enabled = not args.no_cache
 
     print("=" * 70)
     print("Accela Building Permit Scraper for govdirectory")
@@ -766,30 +860,31 @@ def main():
         portals = load_accela_portals()
         updated = 0
         for portal in portals:
-            code = portal.get("code", "")
-            if code in AGENCY_TO_CITY:
-                slug = AGENCY_TO_CITY[code]
-                if update_agency_id(slug, code, args.dry_run):
-                    updated += 1
+            slug = AGENCY_TO_CITY.get(portal.get("code", ""))
+            if slug is None:
+                continue
+            if update_agency_id(slug, portal["code"], args.dry_run):
+                updated += 1
         print(f"\nUpdated {updated} city profiles.")
         return
 
     # Initialize API client
     client = AccelaClient(ACCELA_APP_ID, ACCELA_APP_SECRET)
+    agency_arg = args.agency.upper() if args.agency else None
 
     # Mode: Test authentication only
     if args.test_auth:
         codes = sorted(all_mappings.keys())
-        if args.agency:
-            codes = [args.agency.upper()]
+        if agency_arg:
+            codes = [agency_arg]
         elif args.limit:
             codes = codes[:args.limit]
         test_authentication(client, codes)
         return
 
     # Determine which agencies to process
-    if args.agency:
-        agency_code = args.agency.upper()
+    if agency_arg:
+        agency_code = agency_arg
         slug = all_mappings.get(agency_code)
         if not slug:
             print(f"ERROR: No city mapping for agency '{agency_code}'")
@@ -815,26 +910,33 @@ def main():
 
     print(f"\nProcessing {len(to_process)} agencies...\n")
 
-    # Process each agency
+    # Date windows are fixed for the whole run so every agency is comparable
+    run_start = datetime.now()
+    windows = date_windows(run_start)
+
+    # Process each agency, streaming each result to the JSONL log as it
+    # lands so a crashed run still leaves everything processed so far
     results = []
     successes = 0
     auth_failures = 0
     query_failures = 0
 
-    for i, (agency_code, city_slug) in enumerate(to_process, 1):
-        print(f"\n[{i}/{len(to_process)}] {agency_code} -> {city_slug}")
-
-        result = process_agency(client, agency_code, city_slug, args.dry_run)
-        results.append(result)
+    results_file = os.path.join(SCRIPT_DIR, "accela-permits-results.jsonl")
+    with open(results_file, "w", encoding="utf-8") as results_out:
+        for i, (agency_code, city_slug) in enumerate(to_process, 1):
+            print(f"\n[{i}/{len(to_process)}] {agency_code} -> {city_slug}")
 
-        if result["status"] == "success":
-            successes += 1
-        elif result["status"] == "auth_failed":
-            auth_failures += 1
-        elif result["status"] == "query_failed":
-            query_failures += 1
+            result = process_agency(client, agency_code, city_slug, args.dry_run, windows)
+            results.append(result)
+            results_out.write(json.dumps(result) + "\n")
+            results_out.flush()
 
-        time.sleep(REQUEST_DELAY)
+            if result["status"] == "success":
+                successes += 1
+            elif result["status"] == "auth_failed":
+                auth_failures += 1
+            elif result["status"] == "query_failed":
+                query_failures += 1
 
     # Summary
     print("\n" + "=" * 70)
@@ -865,19 +967,20 @@ def main():
         for err, count in sorted(error_dist.items(), key=lambda x: -x[1]):
             print(f"    {count:3d} x {err}")
 
-    # Write results log
+    # Write the run summary; per-agency results live in the JSONL sidecar
     log_file = os.path.join(SCRIPT_DIR, "accela-permits-log.json")
     log_data = {
-        "run_at": datetime.now().isoformat(),
+        "run_at": run_start.isoformat(),
         "total": len(results),
         "successes": successes,
         "auth_failures": auth_failures,
         "query_failures": query_failures,
-        "results": results,
+        "results_file": os.path.basename(results_file),
     }
     with open(log_file, "w") as f:
         json.dump(log_data, f, indent=2)
     print(f"\n  Log written to: {log_file}")
+    print(f"  Results written to: {results_file}")
 
 
 if __name__ == "__main__":
@@ -18,19 +18,25 @@ import argparse
 import json
 import os
 import sys
-import time
-import urllib.request
 import urllib.parse
 import urllib.error
-from collections import OrderedDict
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import http_cache
+from profile_store import read_profile, write_profile
+from rate_limit import RateLimiter
 
 # --- Configuration ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "public", "data", "cities")
 CDC_API = "https://data.cdc.gov/resource/eav7-hnsx.json"
-REQUEST_DELAY = 0.5  # seconds between API calls
+REQUEST_DELAY = 0.25  # minimum seconds between API call starts (~4 req/s)
+MAX_WORKERS = 8  # concurrent CDC requests
+CACHE_TTL = 7 * 24 * 3600  # PLACES is refreshed yearly; a week is safe
+CITIES_PER_QUERY = 40  # locationname in(...) batch size, keeps URLs short
 REQUEST_TIMEOUT = 30  # seconds per request
+MAX_RETRIES = 3  # per request, for HTTP 429/5xx
 
 # Measure ID -> our field name mapping
 MEASURE_MAP = {
@@ -54,32 +60,70 @@ MEASURE_MAP = {
 }
 
 
-def query_cdc_places(city_name: str, state_abbr: str) -> list[dict]:
-    """Query CDC PLACES API for a single city. Returns list of measure rows."""
+# Only the columns pivot_measures reads (plus locationname for grouping),
+# and only the measures we map -- SODA prunes both server-side
+SELECT_COLUMNS = "locationname,measureid,data_value,year"
+MEASURE_FILTER = "measureid in(" + ",".join(f"'{m}'" for m in MEASURE_MAP) + ")"
+
+RATE_LIMITER = RateLimiter(REQUEST_DELAY)
+
+
+def soql_quote(value: str) -> str:
+    """Quote a string literal for a SoQL $where clause."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def query_cdc_places_by_state(state_abbr: str, city_names: list[str]) -> dict[str, list[dict]] | None:
+    """
+    Query CDC PLACES for several cities in one state with a single request.
+    Returns {locationname: [measure rows]}; cities with no data are absent.
+    Returns None if the request failed, so callers can tell that apart
+    from "no rows" and leave existing profiles alone.
+    """
+    names = ",".join(soql_quote(n) for n in city_names)
     where_clause = (
-        f"locationname='{city_name.replace(chr(39), chr(39)+chr(39))}' AND "
+        f"locationname in({names}) AND "
         f"stateabbr='{state_abbr}' AND "
-        f"data_value_type='Age-adjusted prevalence'"
+        f"data_value_type='Age-adjusted prevalence' AND "
+        f"{MEASURE_FILTER}"
     )
     params = urllib.parse.urlencode({
+        "$select": SELECT_COLUMNS,
         "$where": where_clause,
-        "$limit": "100",
+        "$limit": "50000",
     })
     url = f"{CDC_API}?{params}"
 
     try:
-        req = urllib.request.Request(url, headers={"Accept": "application/json"})
-        with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as resp:
-            return json.loads(resp.read().decode("utf-8"))
+        body = http_cache.get_cached(url, ttl=CACHE_TTL)
+        if body is None:
+            RATE_LIMITER.wait()
+            _, body = http_cache.get(
+                url,
+                headers={"Accept": "application/json"},
+                ttl=CACHE_TTL,
+                timeout=REQUEST_TIMEOUT,
+                retries=MAX_RETRIES,
+                on_throttle=RATE_LIMITER.backoff,
+            )
+            RATE_LIMITER.recover()
+        rows = json.loads(body.decode("utf-8"))
     except urllib.error.HTTPError as e:
-        print(f"  HTTP {e.code} for {city_name}, {state_abbr}: {e.reason}")
-        return []
+        if e.code == 429:
+            RATE_LIMITER.backoff()
+        print(f"  HTTP {e.code} for {state_abbr} ({len(city_names)} cities): {e.reason}")
+        return None
     except urllib.error.URLError as e:
-        print(f"  URL error for {city_name}, {state_abbr}: {e.reason}")
-        return []
+        print(f"  URL error for {state_abbr} ({len(city_names)} cities): {e.reason}")
+        return None
     except Exception as e:
-        print(f"  Error querying {city_name}, {state_abbr}: {e}")
-        return []
+        print(f"  Error querying {state_abbr} ({len(city_names)} cities): {e}")
+        return None
+
+    by_city: dict[str, list[dict]] = {}
+    for row in rows:
+        by_city.setdefault(row.get("locationname", ""), []).append(row)
+    return by_city
 
 
 def pivot_measures(rows: list[dict]) -> dict:
@@ -119,7 +163,7 @@ def pivot_measures(rows: list[dict]) -> dict:
     return health
 
 
-def build_health_section(health_data: dict) -> OrderedDict:
+def build_health_section(health_data: dict) -> dict:
     """Build an ordered health section with all fields (null for missing)."""
     # Canonical field order
     fields = [
@@ -142,35 +186,40 @@ def build_health_section(health_data: dict) -> OrderedDict:
         "checkup_pct",
         "data_year",
     ]
-    result = OrderedDict()
-    for f in fields:
-        result[f] = health_data.get(f)
-    return result
+    return {f: health_data.get(f) for f in fields}
 
 
-def insert_key_after(d: dict, after_key: str, new_key: str, new_value) -> OrderedDict:
+def insert_key_after(d: dict, after_key: str, new_key: str, new_value) -> dict:
     """Insert a new key into a dict after a specified key, preserving order."""
-    result = OrderedDict()
-    inserted = False
-    for k, v in d.items():
-        result[k] = v
-        if k == after_key:
-            result[new_key] = new_value
-            inserted = True
-    if not inserted:
-        result[new_key] = new_value
-    return result
-
-
-def update_city_profile(slug: str, health: OrderedDict, dry_run: bool = False) -> bool:
-    """Merge health data into an existing city JSON profile."""
+    items = list(d.items())
+    pos = list(d).index(after_key) + 1 if after_key in d else len(items)
+    items.insert(pos, (new_key, new_value))
+    return dict(items)
+
+
+def run_timestamp() -> str:
+    """Current UTC time as a naive ISO string (the format profiles already use)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def update_city_profile(
+    slug: str, health: dict, dry_run: bool = False, now_iso: str | None = None
+) -> bool:
+    """
+    Merge health data into an existing city JSON profile.
+    `now_iso` is the run's probe timestamp; main() passes one for every city.
+    """
     filepath = os.path.join(DATA_DIR, f"{slug}.json")
     if not os.path.exists(filepath):
         print(f"  WARNING: Profile not found: {filepath}")
         return False
 
-    with open(filepath, "r") as f:
-        profile = json.load(f, object_pairs_hook=OrderedDict)
+    if dry_run:
+        # Nothing is written, so skip the load/merge/serialize entirely
+        print(f"  [DRY RUN] Would write health data to {filepath}")
+        return True
+
+    profile = read_profile(filepath)
 
     # Insert health section after housing (or after civic_issues if housing absent)
     insert_after = "housing" if "housing" in profile else "environment"
@@ -182,18 +231,19 @@ def update_city_profile(slug: str, health: OrderedDict, dry_run: bool = False) -
 
     # Update data_sources
     if "data_sources" not in profile:
-        profile["data_sources"] = OrderedDict()
+        profile["data_sources"] = {}
     has_data = health.get("data_year") is not None
     profile["data_sources"]["cdc_places"] = "available" if has_data else "unavailable"
 
     # Update provenance
     if "provenance" not in profile:
-        profile["provenance"] = OrderedDict({"last_full_probe": None, "sources": OrderedDict()})
+        profile["provenance"] = {"last_full_probe": None, "sources": {}}
     if "sources" not in profile["provenance"]:
-        profile["provenance"]["sources"] = OrderedDict()
+        profile["provenance"]["sources"] = {}
 
-    now_iso = datetime.utcnow().isoformat()
-    profile["provenance"]["sources"]["cdc_places"] = OrderedDict({
+    if now_iso is None:
+        now_iso = run_timestamp()
+    profile["provenance"]["sources"]["cdc_places"] = {
         "authority": "CDC PLACES (Centers for Disease Control and Prevention)",
         "authority_tier": 1,
         "api_url": f"{CDC_API}?locationname={urllib.parse.quote(profile.get('identity', {}).get('name', slug))}",
@@ -201,15 +251,9 @@ def update_city_profile(slug: str, health: OrderedDict, dry_run: bool = False) -
         "data_vintage": f"BRFSS {health.get('data_year', 'N/A')}",
         "geographic_level": "place",
         "status": "available" if has_data else "unavailable",
-    })
-
-    if dry_run:
-        print(f"  [DRY RUN] Would write health data to {filepath}")
-        return True
+    }
 
-    with open(filepath, "w") as f:
-        json.dump(profile, f, indent=2, ensure_ascii=False)
-        f.write("\n")
+    write_profile(filepath, profile)
 
     return True
 
@@ -218,7 +262,12 @@ def main():
     parser = argparse.ArgumentParser(description="Scrape CDC PLACES health data for city profiles")
     parser.add_argument("--city", type=str, help="Process a single city by slug (e.g., 'chicago')")
     parser.add_argument("--dry-run", action="store_true", help="Preview without writing files")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk HTTP cache")
     args = parser.parse_args()
+    http_cache.enabled = not args.no_cache
+
+    # Every city in this run is stamped with the same probe time
+    run_ts = run_timestamp()
 
     # Load city index
     index_path = os.path.join(DATA_DIR, "_index.json")
@@ -244,22 +293,23 @@ def main():
     not_found = 0
     errors = 0
 
-    for i, city_entry in enumerate(cities):
+    # Resolve canonical names locally, group cities by state, then fan one
+    # query per state (chunked) out to a pool. Profile writes stay on the
+    # main thread so files are never contended.
+    jobs_by_state: dict[str, list[tuple]] = {}
+    for city_entry in cities:
         slug = city_entry["slug"]
         name = city_entry["name"]
         state = city_entry["state"]
 
-        print(f"[{i+1}/{total}] {name}, {state} ({slug})...", end=" ", flush=True)
-
         # Load city profile to get canonical name and state
         profile_path = os.path.join(DATA_DIR, f"{slug}.json")
         if not os.path.exists(profile_path):
-            print("SKIP (no profile)")
+            print(f"{name}, {state} ({slug})... SKIP (no profile)")
             not_found += 1
             continue
 
-        with open(profile_path, "r") as f:
-            profile = json.load(f)
+        profile = read_profile(profile_path)
 
         city_name = profile.get("identity", {}).get("name", name)
         state_abbr = profile.get("identity", {}).get("state", state)
@@ -267,39 +317,65 @@ def main():
         # Skip non-city entities (counties, transit agencies, etc.)
         # They won't match CDC PLACES city-level data
         if not state_abbr or len(state_abbr) != 2:
-            print("SKIP (no state)")
+            print(f"{name}, {state} ({slug})... SKIP (no state)")
             not_found += 1
             continue
 
-        # Query CDC PLACES
-        rows = query_cdc_places(city_name, state_abbr)
-
-        if rows:
-            health_data = pivot_measures(rows)
-            health_section = build_health_section(health_data)
-            has_measures = any(v is not None for k, v in health_section.items() if k != "data_year")
-
-            if has_measures:
-                update_city_profile(slug, health_section, dry_run=args.dry_run)
-                measure_count = sum(1 for k, v in health_section.items() if v is not None and k != "data_year")
-                print(f"OK ({measure_count} measures, year={health_section.get('data_year', '?')})")
-                found += 1
-            else:
-                # API returned rows but none matched our measure list
-                health_section = build_health_section({})
-                update_city_profile(slug, health_section, dry_run=args.dry_run)
-                print("NO MATCHING MEASURES")
-                not_found += 1
-        else:
-            # No data from API — mark as unavailable
-            health_section = build_health_section({})
-            update_city_profile(slug, health_section, dry_run=args.dry_run)
-            print("NOT IN PLACES")
-            not_found += 1
-
-        # Rate limiting
-        if i < total - 1:
-            time.sleep(REQUEST_DELAY)
+        jobs_by_state.setdefault(state_abbr, []).append((slug, name, state, city_name))
+
+    batches = []
+    for state_abbr, jobs in sorted(jobs_by_state.items()):
+        for start in range(0, len(jobs), CITIES_PER_QUERY):
+            batches.append((state_abbr, jobs[start:start + CITIES_PER_QUERY]))
+    job_count = sum(len(jobs) for jobs in jobs_by_state.values())
+    print(f"Querying {job_count} cities in {len(batches)} state batches")
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {
+            pool.submit(
+                query_cdc_places_by_state,
+                state_abbr,
+                sorted({job[3] for job in jobs}),
+            ): jobs
+            for state_abbr, jobs in batches
+        }
+        for future in as_completed(futures):
+            rows_by_city = future.result()
+            for slug, name, state, city_name in futures[future]:
+                done += 1
+                print(f"[{done}/{job_count}] {name}, {state} ({slug})...", end=" ", flush=True)
+
+                if rows_by_city is None:
+                    # The batch request failed: keep the existing health data
+                    print("ERROR (query failed, profile left unchanged)")
+                    errors += 1
+                    continue
+
+                rows = rows_by_city.get(city_name)
+
+                if rows:
+                    health_data = pivot_measures(rows)
+                    health_section = build_health_section(health_data)
+                    has_measures = any(v is not None for k, v in health_section.items() if k != "data_year")
+
+                    if has_measures:
+                        update_city_profile(slug, health_section, dry_run=args.dry_run, now_iso=run_ts)
+                        measure_count = sum(1 for k, v in health_section.items() if v is not None and k != "data_year")
+                        print(f"OK ({measure_count} measures, year={health_section.get('data_year', '?')})")
+                        found += 1
+                    else:
+                        # API returned rows but none matched our measure list
+                        health_section = build_health_section({})
+                        update_city_profile(slug, health_section, dry_run=args.dry_run, now_iso=run_ts)
+                        print("NO MATCHING MEASURES")
+                        not_found += 1
+                else:
+                    # No data from API — mark as unavailable
+                    health_section = build_health_section({})
+                    update_city_profile(slug, health_section, dry_run=args.dry_run, now_iso=run_ts)
+                    print("NOT IN PLACES")
+                    not_found += 1
 
     # Summary
     print("\n" + "=" * 60)
@@ -20,14 +20,22 @@ Usage:
 from __future__ import annotations
 
 import argparse
-import glob
+import functools
+import itertools
 import json
+import operator
 import os
 import sys
+import threading
 import time
-import urllib.request
 import urllib.error
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+import http_cache
+import profile_store
+from profile_store import read_profile, write_profile
+from rate_limit import RateLimiter
 
 # ---------------------------------------------------------------------------
 # Configuration
@@ -54,84 +62,253 @@ ACS_VARIABLES = [
     "NAME",
 ]
 
+# Built once: the ?get= list and request headers are identical on every call
+ACS_API = "https://api.census.gov/data/{year}/acs/acs5"
+ACS_GET = ",".join(ACS_VARIABLES)
+CENSUS_HEADERS = {"User-Agent": "GovDirectory/1.0"}
+
+# Vacancy breakdown (B25004): profile field -> ACS variable
+BREAKDOWN_FIELDS = {
+    "vacant_for_rent": "B25004_002E",
+    "vacant_rented_not_occupied": "B25004_003E",
+    "vacant_for_sale": "B25004_004E",
+    "vacant_sold_not_occupied": "B25004_005E",
+    "vacant_seasonal": "B25004_006E",
+    "vacant_migrant_workers": "B25004_007E",
+    "vacant_other": "B25004_008E",
+}
+
 # Try most recent ACS year first, fall back
 ACS_YEARS = [2023, 2022, 2021]
 
+# ACS 5-Year releases are annual, so cached responses stay valid for a week
+CACHE_TTL = 7 * 24 * 3600
+
+MAX_WORKERS = 10  # concurrent state requests
+LOAD_WORKERS = 16  # concurrent profile reads and writes
+REQUEST_DELAY = 0.1  # minimum seconds between Census request starts
+MAX_RETRIES = 3  # per request, for HTTP 429/5xx
+
+# Ask for the wanted places by code (for=place:a,b,c) up to this many per
+# state; above it a single place:* request is just as cheap
+PLACES_PER_QUERY = 50
+
+RATE_LIMITER = RateLimiter(REQUEST_DELAY)
+
+# After this many 401/403 responses every other request would be refused
+# too, so the run stops instead of marking every city unavailable
+AUTH_FAILURE_LIMIT = 2
+
+# Below this many profiles, thread start-up costs more than it saves
+PARALLEL_SAVE_MIN = 32
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
 
+class CensusAuthError(Exception):
+    """The Census API keeps refusing requests (HTTP 401/403)."""
+
+
+_auth_failures = 0
+_auth_lock = threading.Lock()
+
+
+def record_auth_failure(code: int):
+    """Count a 401/403; raise CensusAuthError once AUTH_FAILURE_LIMIT is hit."""
+    global _auth_failures
+    with _auth_lock:
+        _auth_failures += 1
+        tripped = _auth_failures >= AUTH_FAILURE_LIMIT
+    if tripped:
+        raise CensusAuthError(f"HTTP {code} from the Census API {_auth_failures} times")
+
+
+@functools.lru_cache(maxsize=None)
+def norm_state(fs) -> str:
+    """Zero-pad a state FIPS code to 2 digits (memoized: ~50 distinct values)."""
+    return str(fs).zfill(2)
+
+
+@functools.lru_cache(maxsize=None)
+def norm_place(fp) -> str:
+    """Zero-pad a place FIPS code to 5 digits."""
+    return str(fp).zfill(5)
+
+
+def _load_one(path: str) -> Tuple[str, Optional[dict], Optional[Exception]]:
+    """Read one profile for load_city_profiles -> (path, data, error)."""
+    try:
+        return path, read_profile(path), None
+    except (json.JSONDecodeError, OSError) as e:
+        return path, None, e
+
+
 def load_city_profiles(
     cities_dir: str, single_city: Optional[str] = None
 ) -> List[Tuple[str, dict]]:
     """Load all city profile JSON files (excluding _index.json, _benchmarks.json)."""
-    pattern = os.path.join(cities_dir, "*.json")
+    if single_city:
+        path = os.path.join(cities_dir, f"{single_city}.json")
+        paths = [path] if not single_city.startswith("_") and os.path.isfile(path) else []
+    else:
+        with os.scandir(cities_dir) as it:
+            paths = sorted(
+                e.path for e in it
+                if e.name.endswith(".json") and not e.name.startswith("_")
+            )
+
+    # File reads release the GIL, so a small pool overlaps the per-file
+    # open/read latency; map() keeps the sorted order
     profiles: List[Tuple[str, dict]] = []
-    for path in sorted(glob.glob(pattern)):
-        basename = os.path.basename(path)
-        if basename.startswith("_"):
-            continue
-        if single_city and basename != f"{single_city}.json":
-            continue
-        try:
-            with open(path, "r") as f:
-                data = json.load(f)
-            profiles.append((path, data))
-        except (json.JSONDecodeError, OSError) as e:
-            print(f"  WARN: Could not load {basename}: {e}")
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as pool:
+        for path, data, error in pool.map(_load_one, paths):
+            if error is not None:
+                print(f"  WARN: Could not load {os.path.basename(path)}: {error}")
+            else:
+                profiles.append((path, data))
     return profiles
 
 
-def fetch_acs_state_places(state_fips: str, year: int) -> Optional[List[List[str]]]:
+def fetch_acs_state_places(
+    state_fips: str, year: int, places: Optional[List[str]] = None
+) -> Optional[List[List[str]]]:
     """
-    Fetch ACS vacancy data for ALL places in a state in one API call.
+    Fetch ACS vacancy data for the places in a state in one API call:
+    only the given place codes if `places` is set, otherwise ALL places.
 
     Returns list of rows (each row is a list of strings), or None on failure.
     First row is the header.
     """
-    variables = ",".join(ACS_VARIABLES)
+    if _auth_failures >= AUTH_FAILURE_LIMIT:
+        raise CensusAuthError("Census API access already refused")  # Circuit open
+
+    place_filter = ",".join(places) if places else "*"
     url = (
-        f"https://api.census.gov/data/{year}/acs/acs5"
-        f"?get={variables}&for=place:*&in=state:{state_fips}"
+        ACS_API.format(year=year)
+        + f"?get={ACS_GET}&for=place:{place_filter}&in=state:{state_fips}"
     )
 
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": "GovDirectory/1.0"})
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            if resp.status != 200:
-                return None
-            body = resp.read().decode("utf-8")
-            return json.loads(body)
+        body = http_cache.get_cached(url, ttl=CACHE_TTL)
+        if body is not None:
+            return json.loads(body.decode("utf-8"))
+        RATE_LIMITER.wait()  # Be nice to Census API
+        status, body = http_cache.get(
+            url,
+            headers=CENSUS_HEADERS,
+            ttl=CACHE_TTL,
+            retries=MAX_RETRIES,
+            on_throttle=RATE_LIMITER.backoff,
+        )
+        RATE_LIMITER.recover()
+        if status != 200:
+            return None  # 204: no data for this year
+        return json.loads(body.decode("utf-8"))
     except urllib.error.HTTPError as e:
         if e.code == 204:
             return None  # No data for this year
+        if e.code == 429:
+            RATE_LIMITER.backoff()
         print(f"    HTTP {e.code} for state {state_fips}, year {year}")
+        if e.code in (401, 403):
+            record_auth_failure(e.code)
         return None
     except Exception as e:
         print(f"    Error fetching state {state_fips}: {e}")
         return None
 
 
-def build_vacancy_lookup(year: int, state_fips_list: List[str]) -> Dict[str, dict]:
+def acs_year_available(year: int, state_fips: str) -> bool:
+    """
+    Cheap probe: does the ACS 5-Year API have data for this year?
+    Doubles as the access preflight: a 401/403 raises CensusAuthError.
+    Always goes to the network (ttl=0): a cached answer would hide a
+    revoked key or an outage until the per-state requests.
+    """
+    url = ACS_API.format(year=year) + f"?get=NAME&for=state:{state_fips}"
+    try:
+        status, body = http_cache.get(url, headers=CENSUS_HEADERS, ttl=0)
+        return status == 200 and len(json.loads(body.decode("utf-8"))) > 1
+    except urllib.error.HTTPError as e:
+        if e.code in (401, 403):
+            raise CensusAuthError(f"HTTP {e.code} from the Census API preflight") from e
+        return False
+    except Exception:
+        return False
+
+
+def candidate_years(year: int) -> List[int]:
+    """The requested year first, then the older ACS_YEARS fallbacks."""
+    return [year] + [y for y in ACS_YEARS if y < year]
+
+
+def resolve_acs_year(year: int, probe_state: str) -> List[int]:
+    """
+    Probe once for the newest published year (starting at `year`) and return
+    the candidate list from there, so states don't each rediscover it.
+    Runs before any state request, so refused access stops the run here.
+    """
+    years = candidate_years(year)
+    for i, try_year in enumerate(years):
+        if acs_year_available(try_year, probe_state):
+            return years[i:]
+    return years
+
+
+def fetch_state_rows(
+    state_fips: str, years: List[int], places: Optional[List[str]] = None
+) -> Tuple[Optional[List[List[str]]], Optional[int]]:
+    """Fetch a state's places for the first year in `years` with data -> (rows, year)."""
+    for i, try_year in enumerate(years):
+        if i:
+            time.sleep(0.5)  # Back off only after a failed attempt
+        rows = fetch_acs_state_places(state_fips, try_year, places)
+        if rows and len(rows) > 1:
+            return rows, try_year
+    return None, None
+
+
+def build_vacancy_lookup(
+    year: int, state_fips_list: List[str], wanted: Optional[Set[str]] = None
+) -> Dict[str, dict]:
     """
     Build a lookup dict: (state_fips, place_fips) -> vacancy metrics
     by querying Census ACS for each state.
+
+    If `wanted` is given (a set of "state:place" keys), only those places
+    are requested (see PLACES_PER_QUERY) and parsed; the thousands of other
+    places in each state are skipped.
     """
     lookup: Dict[str, dict] = {}
 
-    for state_fips in sorted(set(state_fips_list)):
-        rows = None
-        actual_year = year
-
-        # Try each year
-        for try_year in ACS_YEARS:
-            rows = fetch_acs_state_places(state_fips, try_year)
-            if rows and len(rows) > 1:
-                actual_year = try_year
-                break
-            time.sleep(0.5)
-
+    states = sorted(set(state_fips_list))  # tolerate unsorted/duplicate input
+    if not states:
+        return lookup
+    years = resolve_acs_year(year, states[0])
+    print(f"  Using ACS {years[0]} (fallbacks: {years[1:] or 'none'})")
+
+    place_lists: List[Optional[List[str]]] = [None] * len(states)
+    if wanted is not None:
+        by_state: Dict[str, List[str]] = {}
+        for key in wanted:
+            state_fips, _, place_fips = key.partition(":")
+            by_state.setdefault(state_fips, []).append(place_fips)
+        place_lists = [
+            sorted(by_state[s])
+            if 0 < len(by_state.get(s, ())) <= PLACES_PER_QUERY else None
+            for s in states
+        ]
+
+    # Fetch states concurrently, then parse here in state order so the
+    # lookup needs no locking and the log stays sorted
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        results = pool.map(
+            fetch_state_rows, states, itertools.repeat(years), place_lists
+        )
+
+    for state_fips, (rows, actual_year) in zip(states, results):
         if not rows or len(rows) < 2:
             print(f"  State {state_fips}: no ACS data available")
             continue
@@ -139,18 +316,33 @@ def build_vacancy_lookup(year: int, state_fips_list: List[str]) -> Dict[str, dic
         header = rows[0]
         print(f"  State {state_fips}: {len(rows)-1} places (ACS {actual_year})")
 
-        # Build column index
+        # Resolve column positions once per state, not once per row
         col = {name: i for i, name in enumerate(header)}
+        place_i = col.get("place", len(header) - 1)
+        state_i = col.get("state", len(header) - 2)
+        try:
+            # (total, occupied, vacant) pulled from a row in one C-level call
+            get_totals = operator.itemgetter(
+                col["B25002_001E"], col["B25002_002E"], col["B25002_003E"]
+            )
+        except KeyError:
+            print(f"  State {state_fips}: unexpected ACS header, skipping")
+            continue
+        breakdown_cols = [
+            (field_name, col[var_name])
+            for field_name, var_name in BREAKDOWN_FIELDS.items()
+            if var_name in col
+        ]
+        data_year = str(actual_year)
 
         for row in rows[1:]:
-            place_fips = row[col.get("place", len(row) - 1)]
-            st = row[col.get("state", len(row) - 2)]
+            key = f"{row[state_i]}:{row[place_i]}"
+            if wanted is not None and key not in wanted:
+                continue
 
             try:
-                total = int(row[col["B25002_001E"]])
-                occupied = int(row[col["B25002_002E"]])
-                vacant = int(row[col["B25002_003E"]])
-            except (ValueError, KeyError):
+                total, occupied, vacant = map(int, get_totals(row))
+            except ValueError:
                 continue
 
             if total == 0:
@@ -162,60 +354,33 @@ def build_vacancy_lookup(year: int, state_fips_list: List[str]) -> Dict[str, dic
                 "vacant_housing_units": vacant,
                 "vacancy_rate": round(vacant / total * 100, 2),
                 "occupancy_rate": round(occupied / total * 100, 2),
-                "data_year": str(actual_year),
+                "data_year": data_year,
                 "vacancy_source": "Census ACS 5-Year",
             }
 
             # Vacancy breakdown (B25004)
-            breakdown_fields = {
-                "vacant_for_rent": "B25004_002E",
-                "vacant_rented_not_occupied": "B25004_003E",
-                "vacant_for_sale": "B25004_004E",
-                "vacant_sold_not_occupied": "B25004_005E",
-                "vacant_seasonal": "B25004_006E",
-                "vacant_migrant_workers": "B25004_007E",
-                "vacant_other": "B25004_008E",
-            }
-
-            for field_name, var_name in breakdown_fields.items():
-                if var_name in col:
-                    try:
-                        val = int(row[col[var_name]])
-                        metrics[field_name] = val
-                    except (ValueError, IndexError):
-                        pass
+            for field_name, i in breakdown_cols:
+                try:
+                    metrics[field_name] = int(row[i])
+                except (ValueError, IndexError):
+                    pass
 
-            key = f"{st}:{place_fips}"
             lookup[key] = metrics
 
-        time.sleep(0.3)  # Be nice to Census API
-
     return lookup
 
 
 def update_city_profile(profile: dict, vacancy: dict) -> dict:
     """Update a city profile dict with vacancy data in the housing section."""
-    if "housing" not in profile:
-        profile["housing"] = {}
-
-    housing = profile["housing"]
-
-    for key, value in vacancy.items():
-        housing[key] = value
-
-    # Update data_sources
-    if "data_sources" not in profile:
-        profile["data_sources"] = {}
-    profile["data_sources"][DATA_SOURCE_KEY] = "available"
+    profile.setdefault("housing", {}).update(vacancy)
+    profile.setdefault("data_sources", {})[DATA_SOURCE_KEY] = "available"
 
     return profile
 
 
 def mark_unavailable(profile: dict) -> dict:
     """Mark Census vacancy data source as unavailable for a city."""
-    if "data_sources" not in profile:
-        profile["data_sources"] = {}
-    profile["data_sources"][DATA_SOURCE_KEY] = "unavailable"
+    profile.setdefault("data_sources", {})[DATA_SOURCE_KEY] = "unavailable"
     return profile
 
 
@@ -223,9 +388,36 @@ def save_profile(path: str, profile: dict, dry_run: bool = False):
     """Save a city profile to disk."""
     if dry_run:
         return
-    with open(path, "w") as f:
-        json.dump(profile, f, indent=2, ensure_ascii=False)
-        f.write("\n")
+    write_profile(path, profile)
+
+
+def apply_and_save(job: Tuple[str, dict, Optional[dict]]) -> None:
+    """
+    Apply one loaded profile's vacancy patch (None marks the source
+    unavailable) and write it back.
+    """
+    path, profile, vacancy = job
+    if vacancy is None:
+        mark_unavailable(profile)
+    else:
+        update_city_profile(profile, vacancy)
+    save_profile(path, profile)
+
+
+def save_all(jobs: List[Tuple[str, dict, Optional[dict]]], dry_run: bool = False):
+    """Apply and write every (path, profile, vacancy) job, in parallel when worthwhile."""
+    if dry_run or not jobs:
+        return
+    # A coalesced store defers the writes, so there is no IO to overlap
+    if len(jobs) < PARALLEL_SAVE_MIN or profile_store.coalescing():
+        for job in jobs:
+            apply_and_save(job)
+        return
+    # Same pool shape as load_city_profiles: the profiles are already in
+    # memory, so the threads only overlap the per-file write latency
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as pool:
+        for _ in pool.map(apply_and_save, jobs):
+            pass
 
 
 # ---------------------------------------------------------------------------
@@ -253,10 +445,16 @@ def main():
         default=2023,
         help="ACS year to query (default: 2023, falls back to earlier years)",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the on-disk HTTP cache",
+    )
     parser.add_argument(
         "--verbose", "-v", action="store_true", help="Verbose output"
     )
     args = parser.parse_args()
+    http_cache.enabled = not args.no_cache
 
     cities_dir = os.path.abspath(CITIES_DIR)
     if not os.path.isdir(cities_dir):
@@ -282,7 +480,7 @@ def main():
 
     # Collect all state FIPS codes we need to query
     fips_map: Dict[str, Tuple[str, str]] = {}  # slug -> (state_fips, place_fips)
-    state_fips_list: List[str] = []
+    state_fips_set: Set[str] = set()
 
     for path, profile in profiles:
         slug = os.path.basename(path).replace(".json", "")
@@ -290,17 +488,24 @@ def main():
         fs = identity.get("fips_state", "")
         fp = identity.get("fips_place", "")
         if fs and fp:
-            fips_map[slug] = (str(fs).zfill(2), str(fp).zfill(5))
-            state_fips_list.append(str(fs).zfill(2))
+            state_fips = norm_state(fs)
+            fips_map[slug] = (state_fips, norm_place(fp))
+            state_fips_set.add(state_fips)
 
     print(f"Cities with FIPS codes: {len(fips_map)}")
-    print(f"Unique states to query: {len(set(state_fips_list))}")
+    print(f"Unique states to query: {len(state_fips_set)}")
     print()
 
     # Fetch all data from Census in batches by state
     print("Fetching ACS data by state...")
     start_time = time.time()
-    lookup = build_vacancy_lookup(args.year, state_fips_list)
+    wanted = {f"{fs}:{fp}" for fs, fp in fips_map.values()}
+    try:
+        lookup = build_vacancy_lookup(args.year, sorted(state_fips_set), wanted)
+    except CensusAuthError as e:
+        print(f"\nERROR: {e}; aborting before any profile is changed.")
+        print("  The Census API is refusing requests -- check access and rerun.")
+        sys.exit(1)
     fetch_time = time.time() - start_time
     print(f"\nFetched {len(lookup)} places in {fetch_time:.1f}s")
     print()
@@ -316,6 +521,9 @@ def main():
         "skipped": 0,
     }
 
+    # Decide each profile's patch here; apply + write happen in save_all
+    jobs: List[Tuple[str, dict, Optional[dict]]] = []
+
     for path, profile in profiles:
         slug = os.path.basename(path).replace(".json", "")
         identity = profile.get("identity", {})
@@ -325,8 +533,7 @@ def main():
         if slug not in fips_map:
             if args.verbose:
                 print(f"  {name}, {state}: no FIPS codes, skipping")
-            profile = mark_unavailable(profile)
-            save_profile(path, profile, args.dry_run)
+            jobs.append((path, profile, None))
             stats["skipped"] += 1
             continue
 
@@ -335,8 +542,7 @@ def main():
 
         if key in lookup:
             vacancy = lookup[key]
-            profile = update_city_profile(profile, vacancy)
-            save_profile(path, profile, args.dry_run)
+            jobs.append((path, profile, vacancy))
             stats["matched"] += 1
             stats["updated"] += 1
 
@@ -348,11 +554,12 @@ def main():
         else:
             if args.verbose:
                 print(f"  {name}, {state}: FIPS {state_fips}{place_fips} not in ACS data")
-            profile = mark_unavailable(profile)
-            save_profile(path, profile, args.dry_run)
+            jobs.append((path, profile, None))
             stats["unmatched"] += 1
             stats["skipped"] += 1
 
+    save_all(jobs, args.dry_run)
+
     elapsed = time.time() - start_time
 
     # Summary
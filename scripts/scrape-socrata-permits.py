@@ -13,21 +13,31 @@ Usage:
   python scripts/scrape-socrata-permits.py --dry-run          # Preview without writing
   python scripts/scrape-socrata-permits.py --discover-only    # Only discover datasets
   python scripts/scrape-socrata-permits.py --all-cities       # Try ALL 290 cities
+  python scripts/scrape-socrata-permits.py --no-cache         # Refetch discovery/schemas
 
 Environment:
   SOCRATA_APP_TOKEN  - Optional. Increases rate limit from 1K to 10K req/hr.
 """
 
 import argparse
+import functools
+import io
 import json
 import os
+import re
+import socket
 import sys
+import threading
 import time
-import urllib.request
 import urllib.parse
 import urllib.error
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+import http_cache
+from profile_store import read_profile, write_profile
+from rate_limit import RateLimiter
+
 # -------------------------------------------------------------------
 # Configuration
 # -------------------------------------------------------------------
@@ -38,7 +48,20 @@ DATA_DIR = os.path.join(PROJECT_ROOT, "public", "data", "cities")
 PORTALS_FILE = os.path.join(PROJECT_ROOT, "docs", "open-data-portals.json")
 
 SOCRATA_APP_TOKEN = os.environ.get("SOCRATA_APP_TOKEN", "")
-REQUEST_DELAY = 0.5  # seconds between API calls
+REQUEST_DELAY = 0.5  # seconds between request starts without an app token
+TOKEN_REQUEST_DELAY = 3600 / 10000  # with SOCRATA_APP_TOKEN: stays under 10K req/hr
+MAX_WORKERS = 6  # cities processed concurrently (each is mostly its own portal)
+
+# Catalog results and dataset schemas change over days, not minutes;
+# the dated aggregate queries are never cached
+DISCOVERY_CACHE_TTL = 24 * 3600  # seconds
+COLUMNS_CACHE_TTL = 7 * 24 * 3600  # seconds
+
+# Shared by all worker threads: spaces request starts across the whole run
+RATE_LIMITER = RateLimiter(TOKEN_REQUEST_DELAY if SOCRATA_APP_TOKEN else REQUEST_DELAY)
+
+CACHE_STATS = {"hits": 0, "misses": 0}
+_cache_lock = threading.Lock()
 
 DISCOVERY_API = "https://api.us.socrata.com/api/catalog/v1"
 
@@ -75,12 +98,23 @@ VALUE_COLUMNS = [
     "total_cost", "amount", "total_fee", "subtotal_paid",
 ]
 
+# Lowercased lookups for the candidate lists above, built once at import
+_DATE_SET = frozenset(c.lower() for c in DATE_COLUMNS)
+_TYPE_SET = frozenset(c.lower() for c in TYPE_COLUMNS)
+_DATE_COLUMNS_T = tuple(DATE_COLUMNS)
+
+# Any year 2010-2024 in a dataset name marks a closed date range
+_NARROW_YEAR_RE = re.compile(r"201\d|202[0-4]")
+
 # Column names that signal a permit dataset
 PERMIT_SIGNAL_COLUMNS = [
     "permit_", "permit_number", "permit_type", "permit_no",
     "permitnumber", "permit_id", "permittype", "permitnum",
 ]
 
+# Matches a column containing any of the signals, in one scan per column
+_PERMIT_SIGNAL_RE = re.compile("|".join(map(re.escape, PERMIT_SIGNAL_COLUMNS)))
+
 # Search queries for Discovery API (tried in order until results found)
 DISCOVERY_QUERIES = [
     "building permit",
@@ -99,6 +133,18 @@ KNOWN_DATASETS = {
     },
 }
 
+# -------------------------------------------------------------------
+# Output
+# -------------------------------------------------------------------
+
+_local = threading.local()
+
+
+def log(*args):
+    """print() to stdout, or to the current city's buffer inside run_city()."""
+    print(*args, file=getattr(_local, "out", None))
+
+
 # -------------------------------------------------------------------
 # HTTP helpers
 # -------------------------------------------------------------------
@@ -110,37 +156,64 @@ def _headers():
     return h
 
 
-def api_get(url, params=None, timeout=30):
-    """GET request returning parsed JSON, or None on error."""
+def _get_body(url, headers, timeout, ttl):
+    """Fetch a URL's body: through the disk cache if ttl > 0, else directly."""
+    if ttl:
+        return http_cache.get(url, headers, ttl=ttl, timeout=timeout)[1]
+    return http_cache.fetch(url, headers, timeout)[2]
+
+
+def count_cache_lookup(hit):
+    with _cache_lock:
+        CACHE_STATS["hits" if hit else "misses"] += 1
+
+
+def api_get(url, params=None, timeout=30, ttl=0):
+    """
+    GET request returning parsed JSON, or None on error.
+
+    Requests go through http_cache, which keeps one connection per portal
+    open per worker thread, so a city's back-to-back queries skip the
+    TCP + TLS handshake. With ttl > 0 the response is also cached on disk
+    and a fresh cached copy is returned without a request (or a wait).
+    Network requests are paced by RATE_LIMITER, which slows down on 429s.
+    """
     if params:
         url = url + "?" + urllib.parse.urlencode(params)
-    req = urllib.request.Request(url, headers=_headers())
+    if ttl and http_cache.enabled:
+        body = http_cache.get_cached(url, ttl)
+        count_cache_lookup(body is not None)
+        if body is not None:
+            return json.loads(body)
+    RATE_LIMITER.wait()
+    return _api_fetch(url, timeout, ttl)
+
+
+def _api_fetch(url, timeout, ttl):
+    headers = _headers()
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            return json.loads(resp.read().decode("utf-8"))
+        data = json.loads(_get_body(url, headers, timeout, ttl))
+        RATE_LIMITER.recover()
+        return data
     except urllib.error.HTTPError as e:
         if e.code == 429:
-            print(f"    RATE LIMITED. Sleeping 10s...")
+            RATE_LIMITER.backoff()
+            log(f"    RATE LIMITED. Sleeping 10s...")
             time.sleep(10)
             try:
-                with urllib.request.urlopen(req, timeout=timeout) as resp:
-                    return json.loads(resp.read().decode("utf-8"))
+                return json.loads(_get_body(url, headers, timeout, ttl))
             except Exception:
                 return None
         elif e.code in (400, 403, 404):
             return None
         else:
-            print(f"    HTTP {e.code}")
+            log(f"    HTTP {e.code}")
             return None
     except Exception as e:
-        print(f"    Error: {e}")
+        log(f"    Error: {e}")
         return None
 
 
-def throttle():
-    time.sleep(REQUEST_DELAY)
-
-
 # -------------------------------------------------------------------
 # Socrata domain resolution
 # -------------------------------------------------------------------
@@ -150,8 +223,8 @@ def load_known_portals():
     mapping = {}
     if not os.path.exists(PORTALS_FILE):
         return mapping
-    with open(PORTALS_FILE) as f:
-        data = json.load(f)
+    with open(PORTALS_FILE, "rb") as f:
+        data = json.loads(f.read())
     for portal in data.get("portals", []):
         if portal.get("platform") != "socrata":
             continue
@@ -186,6 +259,20 @@ def guess_domains(slug, city_name):
     return candidates
 
 
+@functools.lru_cache(maxsize=None)
+def resolves(host):
+    """
+    True if the host has a DNS record. Every Socrata portal (including
+    custom domains) resolves, so guesses that don't can be skipped without
+    spending Discovery API calls on them.
+    """
+    try:
+        socket.getaddrinfo(host, 443, proto=socket.IPPROTO_TCP)
+        return True
+    except (OSError, UnicodeError):
+        return False
+
+
 def discover_datasets(domain, query="building permit"):
     """Use the Socrata Discovery API to find permit datasets on a domain."""
     params = {
@@ -194,8 +281,7 @@ def discover_datasets(domain, query="building permit"):
         "limit": 10,
         "search_context": domain,
     }
-    result = api_get(DISCOVERY_API, params)
-    throttle()
+    result = api_get(DISCOVERY_API, params, ttl=DISCOVERY_CACHE_TTL)
     if not result:
         return []
 
@@ -217,10 +303,7 @@ def discover_datasets(domain, query="building permit"):
         is_permit = any(kw in name_lower for kw in [
             "permit", "building", "construction", "development review"
         ])
-        has_permit_col = any(
-            any(sig in col for sig in PERMIT_SIGNAL_COLUMNS)
-            for col in columns
-        )
+        has_permit_col = any(_PERMIT_SIGNAL_RE.search(col) for col in columns)
 
         if is_permit or has_permit_col:
             datasets.append({
@@ -251,7 +334,15 @@ def discover_all(domain):
 
 
 def find_column(available_columns, candidates):
-    avail_lower = set(c.lower() for c in available_columns)
+    """First of `candidates` present in `available_columns` (case-insensitive)."""
+    return _find_column(tuple(available_columns), tuple(candidates))
+
+
+# A city looks up the same column list several times (and cities often share
+# schemas), so matches are memoized on the frozen column/candidate tuples
+@functools.lru_cache(maxsize=4096)
+def _find_column(available_columns, candidates):
+    avail_lower = {c.lower() for c in available_columns}
     for candidate in candidates:
         if candidate.lower() in avail_lower:
             return candidate
@@ -276,18 +367,12 @@ def pick_best_dataset(datasets):
         if "dashboard" in name_lower:
             score -= 5
 
-        has_date = any(
-            c in [d.lower() for d in DATE_COLUMNS] for c in columns
-        )
-        if has_date:
+        if not _DATE_SET.isdisjoint(columns):
             score += 5
         elif any("date" in c for c in columns):
             score += 3
 
-        has_type = any(
-            c in [t.lower() for t in TYPE_COLUMNS] for c in columns
-        )
-        if has_type:
+        if not _TYPE_SET.isdisjoint(columns):
             score += 3
 
         updated = ds.get("updated_at", "")
@@ -302,22 +387,19 @@ def pick_best_dataset(datasets):
             score += 2
 
         # Penalize narrow date ranges in name (unless "present" is mentioned)
-        for y in range(2010, 2025):
-            if str(y) in name_lower and "present" not in name_lower:
-                score -= 10
-                break
+        if "present" not in name_lower and _NARROW_YEAR_RE.search(name_lower):
+            score -= 10
 
         scored.append((score, ds))
 
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return scored[0][1]
+    # max() keeps the first of equal scores, same as a stable reverse sort
+    return max(scored, key=lambda x: x[0])[1]
 
 
 def get_columns_from_api(domain, dataset_id):
     """Fetch column names by reading one row from the dataset."""
     url = f"https://{domain}/resource/{dataset_id}.json"
-    data = api_get(url, {"$limit": "1"})
-    throttle()
+    data = api_get(url, {"$limit": "1"}, ttl=COLUMNS_CACHE_TTL)
     if data and len(data) > 0:
         return [k.lower() for k in data[0].keys()]
     return []
@@ -332,7 +414,6 @@ def query_permit_count(domain, dataset_id, date_col, start_date):
     where = f"{date_col} > '{start_date}'"
     params = {"$select": "count(*) as cnt", "$where": where}
     data = api_get(url, params)
-    throttle()
     if data and len(data) > 0:
         try:
             return int(float(data[0].get("cnt", 0)))
@@ -341,6 +422,88 @@ def query_permit_count(domain, dataset_id, date_col, start_date):
     return 0
 
 
+def query_permit_stats(domain, dataset_id, date_col, value_col, start_date, prior_start):
+    """
+    The 12-month count, prior 12-month count and (with value_col) 12-month
+    average value in one request, using case() inside the aggregates.
+    Returns (permits_12mo, prior_12mo, avg_value), or None if the portal
+    rejects the query (e.g. avg() over a text column) -- callers then fall
+    back to query_permit_count / query_total_count_between / query_avg_value.
+    """
+    url = f"https://{domain}/resource/{dataset_id}.json"
+    recent = f"{date_col} > '{start_date}'"
+    prior = f"{date_col} < '{start_date}'"
+    select = [
+        f"sum(case({recent}, 1, true, 0)) as cnt",
+        f"sum(case({prior}, 1, true, 0)) as prior_cnt",
+    ]
+    if value_col:
+        select.append(f"avg(case({recent}, {value_col})) as avg_val")
+    params = {"$select": ", ".join(select), "$where": f"{date_col} >= '{prior_start}'"}
+    data = api_get(url, params)
+    if not data:
+        return None
+    row = data[0]
+    try:
+        permits_12mo = int(float(row.get("cnt") or 0))
+        prior_12mo = int(float(row.get("prior_cnt") or 0))
+    except (ValueError, TypeError):
+        return None
+    avg_value = None
+    if value_col:
+        try:
+            val = float(row.get("avg_val", 0))
+            avg_value = round(val, 2) if val > 0 else None
+        except (ValueError, TypeError):
+            pass
+    return permits_12mo, prior_12mo, avg_value
+
+
+def probe_date_columns(domain, dataset_id, date_cols, start_date):
+    """
+    12-month counts for several candidate date columns in one request.
+    Returns {column: count}, or None if the portal rejects the query
+    (callers then count each column with query_permit_count).
+    """
+    url = f"https://{domain}/resource/{dataset_id}.json"
+    select = ", ".join(
+        f"sum(case({col} > '{start_date}', 1, true, 0)) as c{i}"
+        for i, col in enumerate(date_cols)
+    )
+    data = api_get(url, {"$select": select})
+    if not data:
+        return None
+    counts = {}
+    for i, col in enumerate(date_cols):
+        try:
+            counts[col] = int(float(data[0].get(f"c{i}") or 0))
+        except (ValueError, TypeError):
+            counts[col] = 0
+    return counts
+
+
+def count_distinct_values(domain, dataset_id, date_col, columns, start_date):
+    """
+    Distinct non-null values of each column over the 12-month window, in one
+    request. Returns {column: count}, or None if the portal rejects the query.
+    """
+    url = f"https://{domain}/resource/{dataset_id}.json"
+    select = ", ".join(
+        f"count(distinct {col}) as d{i}" for i, col in enumerate(columns)
+    )
+    params = {"$select": select, "$where": f"{date_col} > '{start_date}'"}
+    data = api_get(url, params)
+    if not data:
+        return None
+    counts = {}
+    for i, col in enumerate(columns):
+        try:
+            counts[col] = int(float(data[0].get(f"d{i}") or 0))
+        except (ValueError, TypeError):
+            counts[col] = 1  # Unknown: let the histogram query decide
+    return counts
+
+
 def query_permit_types(domain, dataset_id, date_col, type_col, start_date, limit=15):
     url = f"https://{domain}/resource/{dataset_id}.json"
     where = f"{date_col} > '{start_date}'"
@@ -352,7 +515,6 @@ def query_permit_types(domain, dataset_id, date_col, type_col, start_date, limit
         "$limit": str(limit),
     }
     data = api_get(url, params)
-    throttle()
     if not data:
         return {}
     result = {}
@@ -371,7 +533,6 @@ def query_avg_value(domain, dataset_id, date_col, value_col, start_date):
     where = f"{date_col} > '{start_date}'"
     params = {"$select": f"avg({value_col}) as avg_val", "$where": where}
     data = api_get(url, params)
-    throttle()
     if data and len(data) > 0:
         try:
             val = float(data[0].get("avg_val", 0))
@@ -386,7 +547,6 @@ def query_total_count_between(domain, dataset_id, date_col, start_date, end_date
     where = f"{date_col} >= '{start_date}' AND {date_col} < '{end_date}'"
     params = {"$select": "count(*) as cnt", "$where": where}
     data = api_get(url, params)
-    throttle()
     if data and len(data) > 0:
         try:
             return int(float(data[0].get("cnt", 0)))
@@ -396,7 +556,12 @@ def query_total_count_between(domain, dataset_id, date_col, start_date, end_date
 
 
 def detect_date_column(columns):
-    date_col = find_column(columns, DATE_COLUMNS)
+    return _detect_date_column(tuple(columns))
+
+
+@functools.lru_cache(maxsize=4096)
+def _detect_date_column(columns):
+    date_col = _find_column(columns, _DATE_COLUMNS_T)
     if date_col:
         return date_col
     for col in columns:
@@ -409,10 +574,24 @@ def detect_date_column(columns):
 # Per-city processing
 # -------------------------------------------------------------------
 
-def process_city(slug, city_name, domain, dry_run=False, discover_only=False):
-    print(f"\n{'='*60}")
-    print(f"Processing: {city_name} ({slug}) -> {domain}")
-    print(f"{'='*60}")
+def date_windows(now):
+    """
+    Return (twelve_months_ago, twenty_four_months_ago) for windows ending
+    at `now`, as SoQL floating timestamps.
+    """
+    return (
+        (now - timedelta(days=365)).strftime("%Y-%m-%dT00:00:00"),
+        (now - timedelta(days=730)).strftime("%Y-%m-%dT00:00:00"),
+    )
+
+
+def process_city(slug, city_name, domain, dry_run=False, discover_only=False, now=None):
+    """`now` is the run's start time, shared so every city uses the same windows."""
+    if now is None:
+        now = datetime.now()
+    log(f"\n{'='*60}")
+    log(f"Processing: {city_name} ({slug}) -> {domain}")
+    log(f"{'='*60}")
 
     # Check for known dataset override
     override = KNOWN_DATASETS.get(slug)
@@ -420,14 +599,14 @@ def process_city(slug, city_name, domain, dry_run=False, discover_only=False):
         domain = override["domain"]
         ds_id = override["dataset_id"]
         ds_name = override["name"]
-        print(f"  Using known dataset override: {ds_id} ({ds_name})")
+        log(f"  Using known dataset override: {ds_id} ({ds_name})")
 
         # Fetch columns from API since overrides don't go through Discovery
         columns = get_columns_from_api(domain, ds_id)
         if not columns:
-            print(f"  WARNING: Could not fetch columns for override dataset")
+            log(f"  WARNING: Could not fetch columns for override dataset")
             return None
-        print(f"  Columns ({len(columns)}): {', '.join(columns[:20])}")
+        log(f"  Columns ({len(columns)}): {', '.join(columns[:20])}")
 
         datasets = [{"id": ds_id, "name": ds_name, "domain": domain, "columns": columns}]
         best_dataset = datasets[0]
@@ -436,13 +615,13 @@ def process_city(slug, city_name, domain, dry_run=False, discover_only=False):
         datasets = discover_all(domain)
 
         if not datasets:
-            print(f"  No permit datasets found on {domain}")
+            log(f"  No permit datasets found on {domain}")
             return None
 
-        print(f"  Found {len(datasets)} permit dataset(s):")
+        log(f"  Found {len(datasets)} permit dataset(s):")
         for ds in datasets:
             upd = ds.get("updated_at", "")[:10]
-            print(f"    - {ds['id']}: {ds['name']} (updated {upd})")
+            log(f"    - {ds['id']}: {ds['name']} (updated {upd})")
 
         if discover_only:
             return {"datasets": datasets}
@@ -450,7 +629,7 @@ def process_city(slug, city_name, domain, dry_run=False, discover_only=False):
         # Step 2: Pick best dataset
         best_dataset = pick_best_dataset(datasets)
         if not best_dataset:
-            print(f"  No suitable dataset found")
+            log(f"  No suitable dataset found")
             return None
 
         ds_id = best_dataset["id"]
@@ -461,45 +640,57 @@ def process_city(slug, city_name, domain, dry_run=False, discover_only=False):
             columns = get_columns_from_api(domain, ds_id)
             best_dataset["columns"] = columns
 
-    print(f"  Using dataset: {ds_id} ({best_dataset['name']})")
-    print(f"  Columns ({len(columns)}): {', '.join(columns[:20])}")
+    log(f"  Using dataset: {ds_id} ({best_dataset['name']})")
+    log(f"  Columns ({len(columns)}): {', '.join(columns[:20])}")
 
     # Step 3: Detect key columns
     date_col = detect_date_column(columns)
     type_col = find_column(columns, TYPE_COLUMNS)
     value_col = find_column(columns, VALUE_COLUMNS)
 
-    print(f"  Date column: {date_col}")
-    print(f"  Type column: {type_col}")
-    print(f"  Value column: {value_col}")
+    log(f"  Date column: {date_col}")
+    log(f"  Type column: {type_col}")
+    log(f"  Value column: {value_col}")
 
     if not date_col:
-        print(f"  WARNING: No date column found. Skipping.")
+        log(f"  WARNING: No date column found. Skipping.")
         return None
 
     # Step 4: Date ranges
-    now = datetime.now()
-    twelve_months_ago = (now - timedelta(days=365)).strftime("%Y-%m-%dT00:00:00")
-    twenty_four_months_ago = (now - timedelta(days=730)).strftime("%Y-%m-%dT00:00:00")
-
-    # Step 5: Permit count
-    print(f"  Querying permit count (since {twelve_months_ago[:10]})...")
-    permits_12mo = query_permit_count(domain, ds_id, date_col, twelve_months_ago)
-    print(f"  -> Permits (12mo): {permits_12mo:,}")
+    twelve_months_ago, twenty_four_months_ago = date_windows(now)
+
+    # Step 5: Permit count (with the step 7/8 numbers in the same query)
+    log(f"  Querying permit count (since {twelve_months_ago[:10]})...")
+    stats = query_permit_stats(
+        domain, ds_id, date_col, value_col, twelve_months_ago, twenty_four_months_ago
+    )
+    if stats:
+        permits_12mo = stats[0]
+    else:
+        permits_12mo = query_permit_count(domain, ds_id, date_col, twelve_months_ago)
+    log(f"  -> Permits (12mo): {permits_12mo:,}")
 
     if permits_12mo == 0:
-        print(f"  Trying alternate date columns...")
-        for alt_date in DATE_COLUMNS:
-            if alt_date != date_col and alt_date in [c.lower() for c in columns]:
+        log(f"  Trying alternate date columns...")
+        column_set = {c.lower() for c in columns}
+        alt_dates = [c for c in DATE_COLUMNS if c != date_col and c in column_set]
+        counts = None
+        if len(alt_dates) > 1:
+            counts = probe_date_columns(domain, ds_id, alt_dates, twelve_months_ago)
+        for alt_date in alt_dates:
+            if counts is not None:
+                test_count = counts[alt_date]
+            else:
                 test_count = query_permit_count(domain, ds_id, alt_date, twelve_months_ago)
-                if test_count > 0:
-                    print(f"  Switched to '{alt_date}' ({test_count:,} permits)")
-                    date_col = alt_date
-                    permits_12mo = test_count
-                    break
+            if test_count > 0:
+                log(f"  Switched to '{alt_date}' ({test_count:,} permits)")
+                date_col = alt_date
+                permits_12mo = test_count
+                stats = None
+                break
 
     if permits_12mo == 0 and not override:
-        print(f"  Trying alternate datasets...")
+        log(f"  Trying alternate datasets...")
         for ds in datasets:
             if ds["id"] == ds_id:
                 continue
@@ -511,7 +702,7 @@ def process_city(slug, city_name, domain, dry_run=False, discover_only=False):
                 continue
             alt_count = query_permit_count(domain, ds["id"], alt_date, twelve_months_ago)
             if alt_count > 0:
-                print(f"  Switched to '{ds['id']}' ({ds['name']}) -> {alt_count:,}")
+                log(f"  Switched to '{ds['id']}' ({ds['name']}) -> {alt_count:,}")
                 ds_id = ds["id"]
                 columns = alt_cols
                 date_col = alt_date
@@ -519,12 +710,13 @@ def process_city(slug, city_name, domain, dry_run=False, discover_only=False):
                 type_col = find_column(columns, TYPE_COLUMNS)
                 value_col = find_column(columns, VALUE_COLUMNS)
                 best_dataset = ds
+                stats = None
                 break
 
     # Step 6: Permit types
     permit_types = {}
     if type_col and permits_12mo > 0:
-        print(f"  Querying permit types ('{type_col}')...")
+        log(f"  Querying permit types ('{type_col}')...")
         permit_types = query_permit_types(
             domain, ds_id, date_col, type_col, twelve_months_ago
         )
@@ -538,45 +730,62 @@ def process_city(slug, city_name, domain, dry_run=False, discover_only=False):
 
             if all_numeric or is_free_text:
                 reason = "numeric codes" if all_numeric else "free text"
-                print(f"  '{type_col}' looks like {reason}. Trying alternates...")
-                for alt_type in TYPE_COLUMNS:
-                    if alt_type != type_col and alt_type in [c.lower() for c in columns]:
-                        alt_types = query_permit_types(
-                            domain, ds_id, date_col, alt_type, twelve_months_ago
-                        )
-                        if alt_types:
-                            alt_all_numeric = all(k.isdigit() for k in alt_types.keys())
-                            if not alt_all_numeric:
-                                alt_total = sum(alt_types.values())
-                                alt_top = max(alt_types.values())
-                                if alt_total > 0 and (alt_top / alt_total) >= 0.01:
-                                    print(f"  Switched to type column '{alt_type}'")
-                                    type_col = alt_type
-                                    permit_types = alt_types
-                                    break
+                log(f"  '{type_col}' looks like {reason}. Trying alternates...")
+                column_set = {c.lower() for c in columns}
+                alt_cols = [c for c in TYPE_COLUMNS if c != type_col and c in column_set]
+                # One request tells which candidates are empty in the window,
+                # so only those with values get a histogram query (worth it
+                # once there are several candidates to rule out)
+                distinct = None
+                if len(alt_cols) > 2:
+                    distinct = count_distinct_values(
+                        domain, ds_id, date_col, alt_cols, twelve_months_ago
+                    )
+                for alt_type in alt_cols:
+                    if distinct is not None and not distinct[alt_type]:
+                        continue
+                    alt_types = query_permit_types(
+                        domain, ds_id, date_col, alt_type, twelve_months_ago
+                    )
+                    if alt_types:
+                        alt_all_numeric = all(k.isdigit() for k in alt_types.keys())
+                        if not alt_all_numeric:
+                            alt_total = sum(alt_types.values())
+                            alt_top = max(alt_types.values())
+                            if alt_total > 0 and (alt_top / alt_total) >= 0.01:
+                                log(f"  Switched to type column '{alt_type}'")
+                                type_col = alt_type
+                                permit_types = alt_types
+                                break
         if permit_types:
-            print(f"  -> Top types: {dict(list(permit_types.items())[:5])}")
+            log(f"  -> Top types: {dict(list(permit_types.items())[:5])}")
 
     # Step 7: Average value
     avg_value = None
     if value_col and permits_12mo > 0:
-        print(f"  Querying average value ('{value_col}')...")
-        avg_value = query_avg_value(domain, ds_id, date_col, value_col, twelve_months_ago)
+        if stats:
+            avg_value = stats[2]
+        else:
+            log(f"  Querying average value ('{value_col}')...")
+            avg_value = query_avg_value(domain, ds_id, date_col, value_col, twelve_months_ago)
         if avg_value:
-            print(f"  -> Avg value: ${avg_value:,.2f}")
+            log(f"  -> Avg value: ${avg_value:,.2f}")
 
     # Step 8: YoY trend
     yoy_pct = None
     if permits_12mo > 0:
-        print(f"  Calculating YoY trend...")
-        prior_12mo = query_total_count_between(
-            domain, ds_id, date_col, twenty_four_months_ago, twelve_months_ago
-        )
+        log(f"  Calculating YoY trend...")
+        if stats:
+            prior_12mo = stats[1]
+        else:
+            prior_12mo = query_total_count_between(
+                domain, ds_id, date_col, twenty_four_months_ago, twelve_months_ago
+            )
         if prior_12mo > 0:
             yoy_pct = round(((permits_12mo - prior_12mo) / prior_12mo) * 100, 1)
-            print(f"  -> Prior 12mo: {prior_12mo:,}, YoY: {yoy_pct:+.1f}%")
+            log(f"  -> Prior 12mo: {prior_12mo:,}, YoY: {yoy_pct:+.1f}%")
         else:
-            print(f"  -> No prior-year data for trend")
+            log(f"  -> No prior-year data for trend")
 
     result = {
         "permits_12mo": permits_12mo,
@@ -591,19 +800,50 @@ def process_city(slug, city_name, domain, dry_run=False, discover_only=False):
     }
 
     if not dry_run and permits_12mo > 0:
-        update_city_profile(slug, result)
+        update_city_profile(slug, result, now)
 
     return result
 
 
-def update_city_profile(slug, result):
+def run_city(job, dry_run=False, discover_only=False, now=None):
+    """
+    Process one (slug, name, domain_or_candidates) job in a worker thread.
+    Returns (slug, result, ok, output): the city's log is buffered so that
+    concurrent cities don't interleave their output.
+    """
+    slug, name, domain_or_candidates = job
+    _local.out = out = io.StringIO()
+    try:
+        if isinstance(domain_or_candidates, list):
+            candidates = [c for c in domain_or_candidates if resolves(c)]
+            skipped = len(domain_or_candidates) - len(candidates)
+            if skipped:
+                log(f"\n  Skipping {skipped} unresolvable domain(s) for {name}")
+            for candidate in candidates:
+                log(f"\n  Trying domain: {candidate} for {name}...")
+                test = discover_datasets(candidate)
+                if test is not None:
+                    result = process_city(slug, name, candidate, dry_run, discover_only, now)
+                    if result and result.get("permits_12mo", 0) > 0:
+                        return slug, result, True, out.getvalue()
+            return slug, None, False, out.getvalue()
+
+        result = process_city(slug, name, domain_or_candidates, dry_run, discover_only, now)
+        ok = bool(result and (result.get("permits_12mo", 0) > 0 or result.get("datasets")))
+        return slug, result, ok, out.getvalue()
+    finally:
+        _local.out = None
+
+
+def update_city_profile(slug, result, now=None):
+    if now is None:
+        now = datetime.now()
     filepath = os.path.join(DATA_DIR, f"{slug}.json")
     if not os.path.exists(filepath):
-        print(f"  WARNING: Profile not found: {filepath}")
+        log(f"  WARNING: Profile not found: {filepath}")
         return
 
-    with open(filepath) as f:
-        profile = json.load(f)
+    profile = read_profile(filepath)
 
     dev = profile.get("development", {})
     dev["permits_12mo"] = result["permits_12mo"]
@@ -630,8 +870,8 @@ def update_city_profile(slug, result):
         "authority": "City Open Data Portals (Socrata)",
         "authority_tier": 1,
         "api_url": f"https://{result['domain']}/resource/{result['dataset_id']}.json",
-        "probed_at": datetime.now().isoformat(),
-        "data_vintage": f"Rolling 12-month window ending {datetime.now().strftime('%Y-%m-%d')}",
+        "probed_at": now.isoformat(),
+        "data_vintage": f"Rolling 12-month window ending {now.strftime('%Y-%m-%d')}",
         "geographic_level": "place",
         "status": "available",
         "dataset_name": result["dataset_name"],
@@ -640,11 +880,9 @@ def update_city_profile(slug, result):
     prov["sources"] = sources
     profile["provenance"] = prov
 
-    with open(filepath, "w") as f:
-        json.dump(profile, f, indent=2, ensure_ascii=False)
-        f.write("\n")
+    write_profile(filepath, profile)
 
-    print(f"  UPDATED: {filepath}")
+    log(f"  UPDATED: {filepath}")
 
 
 # -------------------------------------------------------------------
@@ -659,41 +897,40 @@ def main():
                         help="Only discover datasets")
     parser.add_argument("--all-cities", action="store_true",
                         help="Try to discover portals for ALL cities (slow)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the on-disk HTTP cache")
     args = parser.parse_args()
+    http_cache.enabled = not args.no_cache
 
     index_path = os.path.join(DATA_DIR, "_index.json")
-    with open(index_path) as f:
-        city_index = json.load(f)
+    with open(index_path, "rb") as f:
+        city_index = json.loads(f.read())
     print(f"Loaded {len(city_index)} cities from index")
 
     known_portals = load_known_portals()
     print(f"Known Socrata portals: {len(known_portals)}")
 
-    for slug, domain in EXTRA_DOMAIN_MAP.items():
-        if slug not in known_portals:
-            known_portals[slug] = domain
+    # EXTRA_DOMAIN_MAP only fills in cities the portals file doesn't cover
+    known_portals = {**EXTRA_DOMAIN_MAP, **known_portals}
 
     cities_to_process = []
-    for entry in city_index:
-        slug = entry["slug"]
-        name = entry["name"]
-        if args.city and slug != args.city:
-            continue
-        domain = known_portals.get(slug)
-        if domain:
-            cities_to_process.append((slug, name, domain))
-        elif args.all_cities:
-            candidates = guess_domains(slug, name)
-            cities_to_process.append((slug, name, candidates))
-
-    if args.city and not cities_to_process:
+    if args.city:
+        # A single city is always tried: its known portal, else guessed domains
+        names = {entry["slug"]: entry["name"] for entry in city_index}
+        name = names.get(args.city)
+        if name is not None:
+            domain = known_portals.get(args.city) or guess_domains(args.city, name)
+            cities_to_process.append((args.city, name, domain))
+    else:
         for entry in city_index:
-            if entry["slug"] == args.city:
-                candidates = guess_domains(entry["slug"], entry["name"])
-                if args.city in known_portals:
-                    candidates = [known_portals[args.city]]
-                cities_to_process.append((entry["slug"], entry["name"], candidates))
-                break
+            slug = entry["slug"]
+            name = entry["name"]
+            domain = known_portals.get(slug)
+            if domain:
+                cities_to_process.append((slug, name, domain))
+            elif args.all_cities:
+                candidates = guess_domains(slug, name)
+                cities_to_process.append((slug, name, candidates))
 
     print(f"\nCities to process: {len(cities_to_process)}")
 
@@ -701,24 +938,18 @@ def main():
     success_count = 0
     fail_count = 0
 
-    for slug, name, domain_or_candidates in cities_to_process:
-        if isinstance(domain_or_candidates, list):
-            found = False
-            for candidate in domain_or_candidates:
-                print(f"\n  Trying domain: {candidate} for {name}...")
-                test = discover_datasets(candidate)
-                if test is not None:
-                    result = process_city(slug, name, candidate, args.dry_run, args.discover_only)
-                    if result and result.get("permits_12mo", 0) > 0:
-                        results[slug] = result
-                        success_count += 1
-                        found = True
-                        break
-            if not found:
-                fail_count += 1
-        else:
-            result = process_city(slug, name, domain_or_candidates, args.dry_run, args.discover_only)
-            if result and (result.get("permits_12mo", 0) > 0 or result.get("datasets")):
+    # Cities live on different portals, so their request streams overlap;
+    # map() hands back each city's buffered log in the original order
+    worker = functools.partial(
+        run_city,
+        dry_run=args.dry_run,
+        discover_only=args.discover_only,
+        now=datetime.now(),  # One set of date windows for the whole run
+    )
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for slug, result, ok, output in pool.map(worker, cities_to_process):
+            sys.stdout.write(output)
+            if ok:
                 results[slug] = result
                 success_count += 1
             else:
@@ -731,6 +962,8 @@ def main():
     print(f"Cities processed: {len(cities_to_process)}")
     print(f"Successful: {success_count}")
     print(f"Failed/No data: {fail_count}")
+    if http_cache.enabled:
+        print(f"HTTP cache: {CACHE_STATS['hits']} hits, {CACHE_STATS['misses']} misses")
 
     if results:
         print(f"\n{'City':<25} {'Permits 12mo':>12} {'YoY %':>8} {'Avg Value':>12} {'Types':>6}")
@@ -16,18 +16,28 @@ Usage:
     python3 scrape-swagit.py --slugs austintx   # Scrape specific client(s)
     python3 scrape-swagit.py --dry-run           # Preview without DB writes
     python3 scrape-swagit.py --max-pages 10      # Limit pagination depth
+    python3 scrape-swagit.py --workers 1         # Scrape one site at a time
+    python3 scrape-swagit.py --incremental       # Stop paging at already-stored videos
 
 Environment:
     SWAGIT_DB_URL  - PostgreSQL connection string (falls back to hardcoded Railway URL)
+
+Dependencies:
+    pip install requests beautifulsoup4 psycopg2-binary
+    pip install lxml   # optional: much faster HTML parsing, used when present
 """
 
 import argparse
+import io
+import itertools
 import json
 import logging
 import os
 import re
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime, date, timezone
 from typing import Optional, List, Dict, Tuple, Set
@@ -35,7 +45,15 @@ from typing import Optional, List, Dict, Tuple, Set
 import psycopg2
 import psycopg2.extras
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+
+from rate_limit import RateLimiter
+
+try:
+    import lxml  # noqa: F401  (only checked for; BeautifulSoup drives it)
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
 
 # ---------------------------------------------------------------------------
 # Configuration
@@ -50,6 +68,10 @@ REQUEST_TIMEOUT = 30
 RATE_LIMIT_DELAY = 0.35
 MAX_PAGES_DEFAULT = 500
 MAX_RETRIES = 2
+MAX_WORKERS = 6  # sites scraped concurrently
+HLS_WORKERS = 4  # video pages fetched concurrently per site by --enrich-hls
+UPSERT_PAGE_SIZE = 500  # rows per multi-VALUES INSERT in upsert_videos
+COPY_THRESHOLD = 1024  # upsert_videos switches to COPY + staging table at this size
 USER_AGENT = "GovDirectory-SwagitScraper/1.0 (+https://github.com/govdirectory)"
 
 logging.basicConfig(
@@ -64,7 +86,7 @@ log = logging.getLogger("swagit-scraper")
 # Data structures
 # ---------------------------------------------------------------------------
 
-@dataclass
+@dataclass(slots=True)
 class VideoRecord:
     city_slug: str
     video_id: int
@@ -78,7 +100,7 @@ class VideoRecord:
     data: dict = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class ScrapeResult:
     slug: str
     success: bool
@@ -94,23 +116,32 @@ class ScrapeResult:
 # HTTP helpers
 # ---------------------------------------------------------------------------
 
-_session: Optional[requests.Session] = None
+_local = threading.local()
 
 
 def get_session() -> requests.Session:
-    global _session
-    if _session is None:
-        _session = requests.Session()
-        _session.headers.update({"User-Agent": USER_AGENT})
-    return _session
+    """This thread's session (requests.Session isn't safe to share)."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+        session.headers.update({"User-Agent": USER_AGENT})
+    return session
 
 
-def fetch(url: str, retries: int = MAX_RETRIES) -> Optional[requests.Response]:
+def fetch(url: str, retries: int = MAX_RETRIES,
+          limiter: Optional[RateLimiter] = None) -> Optional[requests.Response]:
+    """
+    GET with retries. Without a limiter, sleeps RATE_LIMIT_DELAY after each
+    request; threads hitting the same host share a `limiter` instead.
+    """
     session = get_session()
     for attempt in range(1, retries + 1):
         try:
+            if limiter is not None:
+                limiter.wait()
             resp = session.get(url, timeout=REQUEST_TIMEOUT, allow_redirects=True)
-            time.sleep(RATE_LIMIT_DELAY)
+            if limiter is None:
+                time.sleep(RATE_LIMIT_DELAY)
             if resp.status_code == 200:
                 return resp
             if resp.status_code in (404, 410):
@@ -144,23 +175,42 @@ def parse_date(text: str) -> Optional[date]:
 # HTML parsing
 # ---------------------------------------------------------------------------
 
-def extract_videos_from_html(html: str, city_slug: str) -> List[VideoRecord]:
+# Compiled once: these run per row, per page and per link
+_VIDEO_HREF_RE = re.compile(r"/videos/\d+$")
+_VIDEO_ID_RE = re.compile(r"/videos/(\d+)")
+_VIEW_ID_RE = re.compile(r"/views/(\d+)")
+_NAV_CLASS_RE = re.compile(r"nav.*(pills|tabs).*swagit", re.I)
+
+# Video rows only ever live in tables and the pager is a plain link, so
+# skip building the rest of the page
+_TABLES_AND_LINKS = SoupStrainer(["table", "a"])
+
+
+def extract_videos_from_html(html: str, city_slug: str) -> Tuple[List[VideoRecord], bool]:
     """
-    Parse HTML and extract video records from tables.
+    Parse HTML and extract video records from tables, plus whether the
+    pagination has a 'Next' link (both from one parse).
     Handles two layouts:
       Old-style: <td>Title</td><td>Date</td><td>Duration</td><td>Links</td>
       New-style: <td><a>Title</a><br/>Date</td><td>Duration<br/>items</td>
     """
-    soup = BeautifulSoup(html, "html.parser")
+    # Pages with no video links at all (empty categories, past the last
+    # page) can't yield records; skip the parse and report no next page
+    if not _VIDEO_ID_RE.search(html):
+        return [], False
+
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=_TABLES_AND_LINKS)
     records: List[VideoRecord] = []
     seen_ids: Set[int] = set()
 
     for table in soup.find_all("table"):
         for row in table.find_all("tr"):
-            link = row.find("a", href=re.compile(r"/videos/\d+$"))
+            # One walk for the row's links; the agenda lookup below reuses it
+            anchors = row.find_all("a", href=True)
+            link = next((a for a in anchors if _VIDEO_HREF_RE.search(a["href"])), None)
             if not link:
                 continue
-            match = re.search(r"/videos/(\d+)", link["href"])
+            match = _VIDEO_ID_RE.search(link["href"])
             if not match:
                 continue
             video_id = int(match.group(1))
@@ -210,7 +260,7 @@ def extract_videos_from_html(html: str, city_slug: str) -> List[VideoRecord]:
             video_date = parse_date(date_str) if date_str else None
 
             agenda_url = None
-            for a in row.find_all("a", href=True):
+            for a in anchors:
                 if "/agenda" in a["href"]:
                     agenda_url = a["href"]
                     if not agenda_url.startswith("http"):
@@ -235,16 +285,10 @@ def extract_videos_from_html(html: str, city_slug: str) -> List[VideoRecord]:
                 },
             ))
 
-    return records
-
-
-def has_next_page(html: str) -> bool:
-    """Check if pagination has a 'Next' link."""
-    soup = BeautifulSoup(html, "html.parser")
-    for a in soup.find_all("a", href=True):
-        if a.get_text(strip=True).startswith("Next"):
-            return True
-    return False
+    has_next = "Next" in html and any(
+        a.get_text(strip=True).startswith("Next") for a in soup.find_all("a", href=True)
+    )
+    return records, has_next
 
 
 # ---------------------------------------------------------------------------
@@ -259,6 +303,8 @@ def discover_site(slug: str) -> Optional[Dict]:
       'view_id': int or None
       'categories': [(path, name), ...]
       'default_vids': int (video count on default page)
+      'default_html': str or None (the /views/{id} page, if that is where
+                      /views/default/ landed, so it needn't be fetched again)
     """
     base_url = f"https://{slug}.new.swagit.com"
 
@@ -267,10 +313,12 @@ def discover_site(slug: str) -> Optional[Dict]:
 
     if resp is not None:
         final_url = resp.url
-        view_match = re.search(r"/views/(\d+)", final_url)
+        view_match = _VIEW_ID_RE.search(final_url)
         if view_match:
             view_id = int(view_match.group(1))
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = BeautifulSoup(resp.text, HTML_PARSER)
+            default_html = (resp.text if final_url.rstrip("/") == f"{base_url}/views/{view_id}"
+                            else None)
 
             # Extract old-style categories (/views/{id}/{cat})
             categories = []
@@ -280,7 +328,7 @@ def discover_site(slug: str) -> Optional[Dict]:
                     categories.append((a["href"], a.get_text(strip=True)))
 
             # Count videos on default page
-            vid_count = len(set(re.findall(r"/videos/(\d+)", resp.text)))
+            vid_count = len(set(_VIDEO_ID_RE.findall(resp.text)))
 
             if vid_count > 0 and not categories:
                 return {
@@ -289,6 +337,7 @@ def discover_site(slug: str) -> Optional[Dict]:
                     "view_id": view_id,
                     "categories": [],
                     "default_vids": vid_count,
+                    "default_html": default_html,
                 }
             elif categories:
                 return {
@@ -297,6 +346,7 @@ def discover_site(slug: str) -> Optional[Dict]:
                     "view_id": view_id,
                     "categories": categories,
                     "default_vids": vid_count,
+                    "default_html": default_html,
                 }
             else:
                 # No videos, no categories -- maybe empty
@@ -306,6 +356,7 @@ def discover_site(slug: str) -> Optional[Dict]:
                     "view_id": view_id,
                     "categories": [],
                     "default_vids": 0,
+                    "default_html": None,
                 }
 
     # Try new-style root
@@ -314,11 +365,11 @@ def discover_site(slug: str) -> Optional[Dict]:
         return None
 
     # New-style sites redirect to /{category-name}
-    soup = BeautifulSoup(resp.text, "html.parser")
+    soup = BeautifulSoup(resp.text, HTML_PARSER)
 
     # Look for the sidebar nav (nav-pills-stacked-swagit or nav-tabs-swagit)
     categories = []
-    for nav in soup.find_all("ul", class_=re.compile(r"nav.*(pills|tabs).*swagit", re.I)):
+    for nav in soup.find_all("ul", class_=_NAV_CLASS_RE):
         for a in nav.find_all("a", href=True):
             href = a["href"]
             name = a.get_text(strip=True)
@@ -343,7 +394,7 @@ def discover_site(slug: str) -> Optional[Dict]:
             if not name and href.startswith("/"):
                 name = href.strip("/").split("?")[0].replace("-", " ").title()
             if (href.startswith("/") and
-                not re.match(r"/videos/\d+", href) and
+                not _VIDEO_ID_RE.match(href) and
                 not href.startswith("/admin") and
                 not href.startswith("/events") and
                 "page=" not in href and
@@ -353,7 +404,7 @@ def discover_site(slug: str) -> Optional[Dict]:
                 seen_paths.add(href)
                 categories.append((href, name or href))
 
-    vid_count = len(set(re.findall(r"/videos/(\d+)", resp.text)))
+    vid_count = len(set(_VIDEO_ID_RE.findall(resp.text)))
 
     if categories or vid_count > 0:
         return {
@@ -362,6 +413,7 @@ def discover_site(slug: str) -> Optional[Dict]:
             "view_id": None,
             "categories": categories,
             "default_vids": vid_count,
+            "default_html": None,
         }
 
     return {
@@ -370,13 +422,27 @@ def discover_site(slug: str) -> Optional[Dict]:
         "view_id": None,
         "categories": [],
         "default_vids": 0,
+        "default_html": None,
     }
 
 
-def scrape_paginated(slug: str, base_url: str, path: str, max_pages: int) -> List[VideoRecord]:
-    """Scrape a paginated category path. Works for both old and new style sites."""
-    all_records: List[VideoRecord] = []
-    seen_ids: Set[int] = set()
+def add_new(by_id: Dict[int, VideoRecord], records) -> int:
+    """Add records whose video_id isn't in by_id yet; returns how many were added."""
+    before = len(by_id)
+    for rec in records:
+        by_id.setdefault(rec.video_id, rec)
+    return len(by_id) - before
+
+
+def scrape_paginated(slug: str, base_url: str, path: str, max_pages: int,
+                     known_ids: Optional[Set[int]] = None) -> Dict[int, VideoRecord]:
+    """
+    Scrape a paginated category path. Works for both old and new style sites.
+    Returns the category's records keyed by video_id, in page order.
+    With known_ids (--incremental), stops after the first page whose videos
+    are all already stored: listings are newest first, so the rest are too.
+    """
+    by_id: Dict[int, VideoRecord] = {}
 
     for page in range(1, max_pages + 1):
         if page == 1:
@@ -389,25 +455,30 @@ def scrape_paginated(slug: str, base_url: str, path: str, max_pages: int) -> Lis
         if resp is None:
             break
 
-        page_records = extract_videos_from_html(resp.text, slug)
+        page_records, has_next = extract_videos_from_html(resp.text, slug)
 
-        new_on_page = 0
-        for rec in page_records:
-            if rec.video_id not in seen_ids:
-                seen_ids.add(rec.video_id)
-                all_records.append(rec)
-                new_on_page += 1
+        if add_new(by_id, page_records) == 0:
+            break
 
-        if new_on_page == 0:
+        if known_ids and all(rec.video_id in known_ids for rec in page_records):
             break
 
-        if not has_next_page(resp.text):
+        if not has_next:
             break
 
-    return all_records
+    return by_id
+
 
+def default_page_html(site: Dict) -> Optional[str]:
+    """The old-style /views/{id} page: kept from discover_site() or fetched."""
+    if site["default_html"] is not None:
+        return site["default_html"]
+    resp = fetch(f"{site['base_url']}/views/{site['view_id']}")
+    return resp.text if resp else None
 
-def scrape_client(slug: str, max_pages: int) -> Tuple[List[VideoRecord], int]:
+
+def scrape_client(slug: str, max_pages: int,
+                  known_ids: Optional[Set[int]] = None) -> Tuple[List[VideoRecord], int]:
     """Full scrape of one Swagit client."""
     site = discover_site(slug)
     if site is None:
@@ -425,52 +496,38 @@ def scrape_client(slug: str, max_pages: int) -> Tuple[List[VideoRecord], int]:
         log.warning("  %s: empty site (no videos, no categories)", slug)
         return [], 0
 
-    all_records: List[VideoRecord] = []
-    seen_ids: Set[int] = set()
+    by_id: Dict[int, VideoRecord] = {}
     categories_scraped = 0
 
     # For old_single: grab the default page (has everything)
     if site_type == "old_single":
-        view_id = site["view_id"]
-        resp = fetch(f"{base_url}/views/{view_id}")
-        if resp:
-            records = extract_videos_from_html(resp.text, slug)
-            for rec in records:
-                if rec.video_id not in seen_ids:
-                    seen_ids.add(rec.video_id)
-                    all_records.append(rec)
+        html = default_page_html(site)
+        if html is not None:
+            records, _ = extract_videos_from_html(html, slug)
+            add_new(by_id, records)
             categories_scraped = 1
-        return all_records, categories_scraped
+        return list(by_id.values()), categories_scraped
 
     # For old_multi: scrape default page + each category with pagination
     if site_type == "old_multi":
         # Default page may have some videos (first category)
-        view_id = site["view_id"]
-        resp = fetch(f"{base_url}/views/{view_id}")
-        if resp:
-            records = extract_videos_from_html(resp.text, slug)
-            for rec in records:
-                if rec.video_id not in seen_ids:
-                    seen_ids.add(rec.video_id)
-                    all_records.append(rec)
+        html = default_page_html(site)
+        if html is not None:
+            records, _ = extract_videos_from_html(html, slug)
+            add_new(by_id, records)
             if records:
                 categories_scraped = 1
 
         # Scrape each category with pagination
         for cat_path, cat_name in categories:
             log.info("  %s: scraping category '%s'", slug, cat_name)
-            cat_records = scrape_paginated(slug, base_url, cat_path, max_pages)
-            new_count = 0
-            for rec in cat_records:
-                if rec.video_id not in seen_ids:
-                    seen_ids.add(rec.video_id)
-                    all_records.append(rec)
-                    new_count += 1
+            cat_records = scrape_paginated(slug, base_url, cat_path, max_pages, known_ids)
+            new_count = add_new(by_id, cat_records.values())
             log.info("  %s: '%s' -> %d new (%d total on pages)",
                      slug, cat_name, new_count, len(cat_records))
             categories_scraped += 1
 
-        return all_records, categories_scraped
+        return list(by_id.values()), categories_scraped
 
     # For new_style: scrape each category (all paginated)
     if site_type == "new_style":
@@ -478,21 +535,16 @@ def scrape_client(slug: str, max_pages: int) -> Tuple[List[VideoRecord], int]:
         # we still scrape all categories systematically
         for cat_path, cat_name in categories:
             log.info("  %s: scraping category '%s' (%s)", slug, cat_name, cat_path)
-            cat_records = scrape_paginated(slug, base_url, cat_path, max_pages)
-            new_count = 0
-            for rec in cat_records:
-                if rec.video_id not in seen_ids:
-                    seen_ids.add(rec.video_id)
-                    all_records.append(rec)
-                    new_count += 1
+            cat_records = scrape_paginated(slug, base_url, cat_path, max_pages, known_ids)
+            new_count = add_new(by_id, cat_records.values())
             if new_count > 0:
                 log.info("  %s: '%s' -> %d new (%d total on pages)",
                          slug, cat_name, new_count, len(cat_records))
             categories_scraped += 1
 
-        return all_records, categories_scraped
+        return list(by_id.values()), categories_scraped
 
-    return all_records, categories_scraped
+    return list(by_id.values()), categories_scraped
 
 
 # ---------------------------------------------------------------------------
@@ -503,97 +555,180 @@ def get_db_connection():
     return psycopg2.connect(DB_URL)
 
 
-def get_existing_video_ids(conn, slug: str) -> Dict[int, date]:
+def get_existing_videos(conn, slug: str) -> Dict[int, tuple]:
+    """Stored values of the upserted columns, keyed by video_id."""
     cur = conn.cursor()
-    cur.execute("SELECT video_id, video_date FROM videos WHERE city_slug = %s", (slug,))
-    result = {row[0]: row[1] for row in cur.fetchall()}
+    cur.execute("""
+        SELECT video_id, title, video_date, duration, video_uuid, hls_url,
+               download_url, agenda_url, data
+        FROM videos WHERE city_slug = %s
+    """, (slug,))
+    result = {row[0]: row[1:] for row in cur.fetchall()}
     cur.close()
     return result
 
 
+def video_unchanged(rec: VideoRecord, stored: Optional[tuple]) -> bool:
+    """True if upserting rec would leave the stored row exactly as it is."""
+    if stored is None:
+        return False
+    title, video_date, duration, video_uuid, hls_url, download_url, agenda_url, data = stored
+    # Mirrors the ON CONFLICT clause: None never overwrites (COALESCE),
+    # title and data always do
+    return (
+        rec.title == title
+        and rec.data == data
+        and rec.video_date in (None, video_date)
+        and rec.duration in (None, duration)
+        and rec.video_uuid in (None, video_uuid)
+        and rec.hls_url in (None, hls_url)
+        and rec.download_url in (None, download_url)
+        and rec.agenda_url in (None, agenda_url)
+    )
+
+
+VIDEO_COLUMNS = ("city_slug, video_id, title, video_date, duration, "
+                 "video_uuid, hls_url, download_url, agenda_url, data")
+
+UPSERT_CONFLICT_SQL = """
+    ON CONFLICT (city_slug, video_id) DO UPDATE SET
+        title = EXCLUDED.title,
+        video_date = COALESCE(EXCLUDED.video_date, videos.video_date),
+        duration = COALESCE(EXCLUDED.duration, videos.duration),
+        video_uuid = COALESCE(EXCLUDED.video_uuid, videos.video_uuid),
+        hls_url = COALESCE(EXCLUDED.hls_url, videos.hls_url),
+        download_url = COALESCE(EXCLUDED.download_url, videos.download_url),
+        agenda_url = COALESCE(EXCLUDED.agenda_url, videos.agenda_url),
+        data = EXCLUDED.data
+    RETURNING (xmax = 0) AS is_insert
+"""
+
+
+def video_row(rec: VideoRecord) -> tuple:
+    return (
+        rec.city_slug,
+        rec.video_id,
+        rec.title,
+        rec.video_date,
+        rec.duration,
+        rec.video_uuid,
+        rec.hls_url,
+        rec.download_url,
+        rec.agenda_url,
+        json.dumps(rec.data),
+    )
+
+
+def copy_field(value) -> str:
+    """Encode one value for COPY's text format."""
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def upsert_via_copy(cur, records: List[VideoRecord]) -> List[tuple]:
+    """COPY records into a temp staging table, then merge it with one INSERT."""
+    # CREATE ... AS ... WITH NO DATA copies the column types but not the
+    # defaults, so staging rows never draw from the videos id sequence.
+    cur.execute(f"""
+        CREATE TEMP TABLE _videos_stage ON COMMIT DROP AS
+        SELECT {VIDEO_COLUMNS} FROM videos WITH NO DATA
+    """)
+    buf = io.StringIO()
+    for rec in records:
+        buf.write("\t".join(copy_field(v) for v in video_row(rec)) + "\n")
+    buf.seek(0)
+    cur.copy_expert(f"COPY _videos_stage ({VIDEO_COLUMNS}) FROM STDIN", buf)
+    cur.execute(f"""
+        INSERT INTO videos ({VIDEO_COLUMNS})
+        SELECT {VIDEO_COLUMNS} FROM _videos_stage
+        {UPSERT_CONFLICT_SQL}
+    """)
+    return cur.fetchall()
+
+
 def upsert_videos(conn, records: List[VideoRecord]) -> Tuple[int, int]:
+    """
+    Upsert records in multi-row INSERT statements (UPSERT_PAGE_SIZE rows per
+    round-trip), or through COPY for batches of COPY_THRESHOLD or more.
+    Records must be unique by video_id, as scrape_client returns them: one
+    statement can't update the same row twice. The caller commits.
+    """
     if not records:
         return 0, 0
 
     cur = conn.cursor()
-    new_count = 0
-    updated_count = 0
+    if len(records) >= COPY_THRESHOLD:
+        rows = upsert_via_copy(cur, records)
+    else:
+        rows = psycopg2.extras.execute_values(
+            cur,
+            f"INSERT INTO videos ({VIDEO_COLUMNS}) VALUES %s {UPSERT_CONFLICT_SQL}",
+            [video_row(rec) for rec in records],
+            page_size=UPSERT_PAGE_SIZE, fetch=True,
+        )
 
-    for rec in records:
-        cur.execute("""
-            INSERT INTO videos (city_slug, video_id, title, video_date, duration,
-                                video_uuid, hls_url, download_url, agenda_url, data)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (city_slug, video_id) DO UPDATE SET
-                title = EXCLUDED.title,
-                video_date = COALESCE(EXCLUDED.video_date, videos.video_date),
-                duration = COALESCE(EXCLUDED.duration, videos.duration),
-                video_uuid = COALESCE(EXCLUDED.video_uuid, videos.video_uuid),
-                hls_url = COALESCE(EXCLUDED.hls_url, videos.hls_url),
-                download_url = COALESCE(EXCLUDED.download_url, videos.download_url),
-                agenda_url = COALESCE(EXCLUDED.agenda_url, videos.agenda_url),
-                data = EXCLUDED.data
-            RETURNING (xmax = 0) AS is_insert
-        """, (
-            rec.city_slug,
-            rec.video_id,
-            rec.title,
-            rec.video_date,
-            rec.duration,
-            rec.video_uuid,
-            rec.hls_url,
-            rec.download_url,
-            rec.agenda_url,
-            json.dumps(rec.data),
-        ))
-        row = cur.fetchone()
-        if row and row[0]:
-            new_count += 1
-        else:
-            updated_count += 1
+    new_count = sum(1 for (is_insert,) in rows if is_insert)
+    updated_count = len(rows) - new_count
 
-    conn.commit()
     cur.close()
     return new_count, updated_count
 
 
-def update_client_video_count(conn, slug: str):
+def update_client_video_counts(conn, slugs: List[str]):
+    """Refresh clients.video_count for all the given clients in one statement."""
     cur = conn.cursor()
     cur.execute("""
         UPDATE clients
-        SET video_count = (SELECT COUNT(*) FROM videos WHERE city_slug = %s),
+        SET video_count = (SELECT COUNT(*) FROM videos WHERE city_slug = clients.slug),
             updated_at = NOW()
-        WHERE slug = %s
-    """, (slug, slug))
-    conn.commit()
+        WHERE slug = ANY(%s)
+    """, (slugs,))
     cur.close()
 
 
-def update_scrape_progress(conn, slug: str, result: ScrapeResult):
-    cur = conn.cursor()
+def progress_row(result: ScrapeResult) -> tuple:
+    """A scrape_progress row for a finished client, stamped now."""
     now = datetime.now(timezone.utc)
-    cur.execute("""
+    return (
+        result.slug,
+        "full_rescrape",
+        "completed" if result.success else "error",
+        result.videos_found,
+        result.error[:500] if result.error else None,
+        now, now, now,
+    )
+
+
+def update_scrape_progress(conn, rows: List[tuple]):
+    """Upsert progress_row() tuples (unique by slug) in one statement."""
+    cur = conn.cursor()
+    psycopg2.extras.execute_values(cur, """
         INSERT INTO scrape_progress (city_slug, endpoint, status, records_scraped,
                                      error_message, started_at, completed_at, updated_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES %s
         ON CONFLICT (city_slug, endpoint) DO UPDATE SET
             status = EXCLUDED.status,
             records_scraped = EXCLUDED.records_scraped,
             error_message = EXCLUDED.error_message,
             completed_at = EXCLUDED.completed_at,
             updated_at = EXCLUDED.updated_at
-    """, (
-        slug,
-        "full_rescrape",
-        "completed" if result.success else "error",
-        result.videos_found,
-        result.error[:500] if result.error else None,
-        now, now, now,
-    ))
-    conn.commit()
+    """, rows)
     cur.close()
 
 
+def get_known_video_ids(conn, slugs: List[str]) -> Dict[str, Set[int]]:
+    """Stored video_ids for each of the given clients, in one query."""
+    cur = conn.cursor()
+    cur.execute("SELECT city_slug, video_id FROM videos WHERE city_slug = ANY(%s)", (slugs,))
+    known: Dict[str, Set[int]] = {}
+    for slug, video_id in cur.fetchall():
+        known.setdefault(slug, set()).add(video_id)
+    cur.close()
+    return known
+
+
 def get_all_client_slugs(conn) -> List[str]:
     cur = conn.cursor()
     cur.execute("SELECT slug FROM clients ORDER BY slug")
@@ -606,22 +741,24 @@ def get_all_client_slugs(conn) -> List[str]:
 # HLS enrichment (optional)
 # ---------------------------------------------------------------------------
 
-def enrich_video_hls(slug: str, video_id: int) -> Tuple[Optional[str], Optional[str]]:
+_HLS_RE = re.compile(r'(https://archive-stream\.granicus\.com/[^\s"\'<>]+\.m3u8[^\s"\'<>]*)')
+_UUID_RE = re.compile(r'([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})')
+
+
+def enrich_video_hls(slug: str, video_id: int,
+                     limiter: Optional[RateLimiter] = None
+                     ) -> Tuple[Optional[str], Optional[str]]:
     url = f"https://{slug}.new.swagit.com/videos/{video_id}"
-    resp = fetch(url, retries=1)
+    resp = fetch(url, retries=1, limiter=limiter)
     if resp is None:
         return None, None
 
     text = resp.text
-    hls_match = re.search(
-        r'(https://archive-stream\.granicus\.com/[^\s"\'<>]+\.m3u8[^\s"\'<>]*)', text
-    )
+    hls_match = _HLS_RE.search(text)
     hls_url = hls_match.group(1) if hls_match else None
 
     video_uuid = None
-    uuid_match = re.search(
-        r'([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})', text
-    )
+    uuid_match = _UUID_RE.search(text)
     if uuid_match:
         video_uuid = uuid_match.group(1)
 
@@ -629,24 +766,35 @@ def enrich_video_hls(slug: str, video_id: int) -> Tuple[Optional[str], Optional[
 
 
 def enrich_missing_hls(conn, slug: str, records: List[VideoRecord],
-                       existing_ids: Dict[int, date], limit: int = 20):
-    new_records = [r for r in records if r.video_id not in existing_ids]
+                       existing: Dict[int, tuple], limit: int = 20):
+    new_records = [r for r in records if r.video_id not in existing]
     new_records.sort(key=lambda r: r.video_date or date.min, reverse=True)
-    enriched = 0
-
-    for rec in new_records[:limit]:
-        hls_url, video_uuid = enrich_video_hls(slug, rec.video_id)
-        if hls_url or video_uuid:
-            cur = conn.cursor()
-            cur.execute("""
-                UPDATE videos
-                SET hls_url = COALESCE(%s, hls_url),
-                    video_uuid = COALESCE(%s, video_uuid)
-                WHERE city_slug = %s AND video_id = %s
-            """, (hls_url, video_uuid, slug, rec.video_id))
-            conn.commit()
-            cur.close()
-            enriched += 1
+    video_ids = [rec.video_id for rec in new_records[:limit]]
+
+    # The workers all hit this site's host; one limiter keeps them to the
+    # same RATE_LIMIT_DELAY spacing a single thread would use
+    limiter = RateLimiter(RATE_LIMIT_DELAY)
+    with ThreadPoolExecutor(max_workers=HLS_WORKERS) as pool:
+        found = pool.map(enrich_video_hls, itertools.repeat(slug), video_ids,
+                         itertools.repeat(limiter))
+        updates = [
+            (slug, video_id, hls_url, video_uuid)
+            for video_id, (hls_url, video_uuid) in zip(video_ids, found)
+            if hls_url or video_uuid
+        ]
+    enriched = len(updates)
+
+    if updates:
+        cur = conn.cursor()
+        psycopg2.extras.execute_values(cur, """
+            UPDATE videos
+            SET hls_url = COALESCE(v.hls_url, videos.hls_url),
+                video_uuid = COALESCE(v.video_uuid, videos.video_uuid)
+            FROM (VALUES %s) AS v(city_slug, video_id, hls_url, video_uuid)
+            WHERE videos.city_slug = v.city_slug AND videos.video_id = v.video_id
+        """, updates)
+        conn.commit()
+        cur.close()
 
     if enriched:
         log.info("  %s: enriched %d/%d new videos with HLS URLs",
@@ -657,16 +805,34 @@ def enrich_missing_hls(conn, slug: str, records: List[VideoRecord],
 # Main orchestrator
 # ---------------------------------------------------------------------------
 
-def scrape_one_client(slug: str, conn, max_pages: int, dry_run: bool,
-                      enrich_hls: bool) -> ScrapeResult:
+def scrape_site(slug: str, max_pages: int,
+                known_ids: Optional[Set[int]] = None
+                ) -> Tuple[Optional[List[VideoRecord]], int, Optional[Exception], float]:
+    """
+    Network half of a client scrape, run on a worker thread. Returns
+    (records, categories_scraped, error, seconds); records is None on error.
+    """
     t0 = time.time()
+    log.info("Scraping %s ...", slug)
+    try:
+        records, categories_scraped = scrape_client(slug, max_pages, known_ids)
+        return records, categories_scraped, None, time.time() - t0
+    except Exception as exc:
+        return None, 0, exc, time.time() - t0
+
+
+def scrape_one_client(slug: str, conn, scraped: Tuple, dry_run: bool,
+                      enrich_hls: bool) -> ScrapeResult:
+    """Database half of a client scrape for a scrape_site() result (main thread)."""
+    records, categories_scraped, error, scrape_seconds = scraped
+    t0 = time.time() - scrape_seconds
     result = ScrapeResult(slug=slug, success=False)
 
     try:
-        log.info("Scraping %s ...", slug)
-        existing_ids = get_existing_video_ids(conn, slug) if not dry_run else {}
+        if error is not None:
+            raise error
+        existing = get_existing_videos(conn, slug) if not dry_run else {}
 
-        records, categories_scraped = scrape_client(slug, max_pages)
         result.videos_found = len(records)
         result.categories_scraped = categories_scraped
 
@@ -676,17 +842,20 @@ def scrape_one_client(slug: str, conn, max_pages: int, dry_run: bool,
             log.info("  %s: [DRY RUN] would upsert %d videos", slug, len(records))
             return result
 
-        new_count, updated_count = upsert_videos(conn, records)
+        # Only new or changed rows are sent; videos_updated counts real changes
+        changed = [rec for rec in records
+                   if not video_unchanged(rec, existing.get(rec.video_id))]
+
+        # One transaction (one commit) for the client's videos; main()
+        # writes video_count and progress for all successful clients at the end
+        with conn:
+            new_count, updated_count = upsert_videos(conn, changed)
         result.videos_new = new_count
         result.videos_updated = updated_count
         result.success = True
 
-        update_client_video_count(conn, slug)
-
         if enrich_hls and new_count > 0:
-            enrich_missing_hls(conn, slug, records, existing_ids, limit=20)
-
-        update_scrape_progress(conn, slug, result)
+            enrich_missing_hls(conn, slug, records, existing, limit=20)
 
         result.elapsed_seconds = time.time() - t0
         log.info(
@@ -702,7 +871,10 @@ def scrape_one_client(slug: str, conn, max_pages: int, dry_run: bool,
 
         if not dry_run:
             try:
-                update_scrape_progress(conn, slug, result)
+                # Failures are recorded right away, not batched with successes
+                conn.rollback()
+                with conn:
+                    update_scrape_progress(conn, [progress_row(result)])
             except Exception:
                 pass
 
@@ -719,6 +891,10 @@ def main():
                         help=f"Max pagination pages per category (default: {MAX_PAGES_DEFAULT})")
     parser.add_argument("--enrich-hls", action="store_true",
                         help="Fetch HLS URLs for new videos (slower)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Stop paging a category at the first page of already-stored videos")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help=f"Sites scraped in parallel (default: {MAX_WORKERS})")
     parser.add_argument("--verbose", "-v", action="store_true",
                         help="Debug logging")
     args = parser.parse_args()
@@ -734,16 +910,33 @@ def main():
     else:
         slugs = get_all_client_slugs(conn)
 
-    log.info("Will scrape %d clients (max_pages=%d, dry_run=%s, enrich_hls=%s)",
-             len(slugs), args.max_pages, args.dry_run, args.enrich_hls)
+    log.info("Will scrape %d clients (max_pages=%d, dry_run=%s, enrich_hls=%s, "
+             "incremental=%s, workers=%d)", len(slugs), args.max_pages, args.dry_run,
+             args.enrich_hls, args.incremental, args.workers)
+
+    known = get_known_video_ids(conn, slugs) if args.incremental else {}
 
     results: List[ScrapeResult] = []
+    progress: Dict[str, tuple] = {}  # successful clients' rows, written after the loop
     t_start = time.time()
 
-    for i, slug in enumerate(slugs, 1):
-        log.info("--- [%d/%d] %s ---", i, len(slugs), slug)
-        result = scrape_one_client(slug, conn, args.max_pages, args.dry_run, args.enrich_hls)
-        results.append(result)
+    # Sites are scraped concurrently (each slug is its own host, so the
+    # per-request delay still paces every site); database writes stay on
+    # this thread, in slug order.
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        scraped = pool.map(scrape_site, slugs, itertools.repeat(args.max_pages),
+                           [known.get(slug) for slug in slugs])
+        for i, (slug, site) in enumerate(zip(slugs, scraped), 1):
+            log.info("--- [%d/%d] %s ---", i, len(slugs), slug)
+            result = scrape_one_client(slug, conn, site, args.dry_run, args.enrich_hls)
+            results.append(result)
+            if result.success and not args.dry_run:
+                progress[slug] = progress_row(result)
+
+    if progress:
+        with conn:
+            update_client_video_counts(conn, list(progress))
+            update_scrape_progress(conn, list(progress.values()))
 
     conn.close()
     elapsed = time.time() - t_start